@@ -5,21 +5,36 @@ Provides a modern web interface to view and manage database models.
 """
 
 import datetime
+import functools
 import os
 import secrets
+import time
 
 from nicegui import app, ui
+from peewee import JOIN, fn
 
-from db import Chat, CommandLog, User
+from db import Chat, CommandLog, CommandLogIndex, User, db
 
 # Configuration from environment
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "changeme")
 ADMIN_PORT = int(os.getenv("ADMIN_PORT", "5000"))
-ADMIN_SECRET_KEY = os.getenv("ADMIN_SECRET_KEY", secrets.token_hex(16))
+ADMIN_SECRET_KEY = os.getenv("ADMIN_SECRET_KEY") or secrets.token_hex(16)
 
-# Store for authenticated sessions
-app.storage.secret = ADMIN_SECRET_KEY
+# Dashboard counts may be up to this many seconds stale
+DASHBOARD_STATS_TTL = 30
+
+# Users and chats are loaded in slices of this many rows ("Load more")
+TABLE_ROWS_LIMIT = 1000
+
+# Command logs are paginated server-side; these columns can be sorted
+LOGS_PAGE_SIZE = 20
+LOG_SORT_FIELDS = {
+    "time": CommandLog.timestamp,
+    "command": CommandLog.command,
+    "username": CommandLog.username,
+    "chat_type": Chat.chat_type,
+}
 
 
 def check_auth() -> bool:
@@ -27,12 +42,143 @@ def check_auth() -> bool:
     return app.storage.user.get("authenticated", False)
 
 
-def format_timestamp(ts: int) -> str:
-    """Format Unix timestamp to readable string."""
-    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+@functools.lru_cache(maxsize=1)
+def day_start(day: datetime.date) -> int:
+    """Unix timestamp of local midnight for ``day``, computed once per day."""
+    return int(datetime.datetime.combine(day, datetime.time()).timestamp())
+
+
+@functools.lru_cache(maxsize=8)
+def get_dashboard_stats(today_start: int, ttl_bucket: int) -> tuple[int, int, int, int]:
+    """
+    Fetch users, chats, commands and commands-today counts in one query.
+
+    ``ttl_bucket`` only takes part in the cache key: pass
+    ``int(time.time()) // DASHBOARD_STATS_TTL`` so cached counts expire after
+    at most ``DASHBOARD_STATS_TTL`` seconds.
+    """
+    cursor = db.execute_sql(
+        f"""
+        SELECT
+            (SELECT COUNT(*) FROM "{User._meta.table_name}"),
+            (SELECT COUNT(*) FROM "{Chat._meta.table_name}"),
+            (SELECT COUNT(*) FROM "{CommandLog._meta.table_name}"),
+            (SELECT COUNT(*) FROM "{CommandLog._meta.table_name}" WHERE timestamp >= ?)
+        """,
+        (today_start,),
+    )
+    return cursor.fetchone()
+
+
+def _fill_blanks(rows: list[dict], fields: tuple[str, ...]) -> list[dict]:
+    """Replace empty values in the given fields with a dash, in place."""
+    for row in rows:
+        for field in fields:
+            if not row[field]:
+                row[field] = "-"
+    return rows
+
+
+def get_user_rows(offset: int = 0) -> list[dict]:
+    """Fetch a slice of users as table rows, newest first."""
+    users = (
+        User.select(User.id, User.telegram_id, User.telegram_username, User.lastfm_username)
+        .order_by(User.id.desc())
+        .limit(TABLE_ROWS_LIMIT)
+        .offset(offset)
+        .dicts()
+    )
+    return _fill_blanks(list(users), ("telegram_username", "lastfm_username"))
+
+
+def get_chat_rows(offset: int = 0) -> list[dict]:
+    """Fetch a slice of chats as table rows, newest first."""
+    chats = (
+        Chat.select(Chat.id, Chat.telegram_id, Chat.telegram_chat_name, Chat.chat_type)
+        .order_by(Chat.id.desc())
+        .limit(TABLE_ROWS_LIMIT)
+        .offset(offset)
+        .dicts()
+    )
+    return _fill_blanks(list(chats), ("telegram_chat_name", "chat_type"))
+
+
+def command_log_query():
+    """Build the command log table query, joined with chats, newest first."""
+    return (
+        CommandLog.select(
+            # Format in SQLite rather than building a datetime per row
+            fn.strftime(
+                "%Y-%m-%d %H:%M:%S", CommandLog.timestamp, "unixepoch", "localtime"
+            ).alias("time"),
+            CommandLog.command,
+            CommandLog.username,
+            CommandLog.args,
+            Chat.telegram_chat_name.alias("chat_name"),
+            Chat.chat_type,
+        )
+        .join(Chat, JOIN.LEFT_OUTER)
+        .order_by(CommandLog.timestamp.desc())
+        .dicts()
+    )
+
+
+def virtual_table(columns: list[dict], rows: list[dict], row_key: str) -> ui.table:
+    """Create a table that only renders the rows scrolled into view."""
+    return (
+        ui.table(columns=columns, rows=rows, row_key=row_key, pagination=0)
+        .props('virtual-scroll :rows-per-page-options="[0]"')
+        .classes("w-full")
+        .style("height: 70vh")
+    )
+
+
+def load_more(table: ui.table, get_rows) -> None:
+    """Append the next slice from ``get_rows(offset)`` to ``table``."""
+    rows = get_rows(offset=len(table.rows))
+    if not rows:
+        ui.notify("No more rows")
+        return
+    table.rows.extend(rows)
+    table.update()
+
+
+def get_command_log_rows(query) -> list[dict]:
+    """Materialize a ``command_log_query()`` into table rows."""
+    return _fill_blanks(list(query), ("username", "args", "chat_name", "chat_type"))
+
+
+def navigate_to(path: str):
+    """Build a click handler that navigates to ``path``."""
+    return lambda: ui.navigate.to(path)
+
+
+def logout() -> None:
+    """Clear the session and go back to the login page."""
+    app.storage.user.clear()
+    ui.navigate.to("/login")
+
+
+# Header navigation, built once and shared by every page render
+NAV_ITEMS = (
+    ("Dashboard", navigate_to("/")),
+    ("Users", navigate_to("/users")),
+    ("Chats", navigate_to("/chats")),
+    ("Command Logs", navigate_to("/logs")),
+    ("Logout", logout),
+)
+
+
+def render_header() -> None:
+    """Render the header with the navigation shared by all admin pages."""
+    with ui.header().classes("bg-blue-600"):
+        ui.label("LastfmBucket Admin").classes("text-xl text-white font-bold")
+        ui.space()
+        with ui.row():
+            for label, handler in NAV_ITEMS:
+                ui.button(label, on_click=handler).props("flat color=white")
 
 
-@ui.page("/login")
 def login_page():
     """Login page."""
 
@@ -51,64 +197,39 @@ def login_page():
         ui.button("Login", on_click=try_login).classes("w-full mt-4")
 
 
-@ui.page("/")
 def dashboard():
     """Main dashboard page."""
     if not check_auth():
         return ui.navigate.to("/login")
 
-    with ui.header().classes("bg-blue-600"):
-        ui.label("LastfmBucket Admin").classes("text-xl text-white font-bold")
-        ui.space()
-        with ui.row():
-            ui.button("Dashboard", on_click=lambda: ui.navigate.to("/")).props("flat color=white")
-            ui.button("Users", on_click=lambda: ui.navigate.to("/users")).props("flat color=white")
-            ui.button("Chats", on_click=lambda: ui.navigate.to("/chats")).props("flat color=white")
-            ui.button("Command Logs", on_click=lambda: ui.navigate.to("/logs")).props(
-                "flat color=white"
-            )
-            ui.button(
-                "Logout",
-                on_click=lambda: (
-                    app.storage.user.clear(),
-                    ui.navigate.to("/login"),
-                ),
-            ).props("flat color=white")
+    render_header()
 
     with ui.column().classes("w-full p-4"):
         ui.label("Dashboard").classes("text-2xl font-bold mb-4")
 
         # Stats cards
+        total_users, total_chats, total_commands, commands_today = get_dashboard_stats(
+            day_start(datetime.date.today()), int(time.time()) // DASHBOARD_STATS_TTL
+        )
         with ui.row().classes("w-full gap-4"):
             with ui.card().classes("bg-blue-500 text-white"):
                 ui.label("Total Users").classes("text-sm opacity-80")
-                ui.label(str(User.select().count())).classes("text-3xl font-bold")
+                ui.label(str(total_users)).classes("text-3xl font-bold")
 
             with ui.card().classes("bg-green-500 text-white"):
                 ui.label("Total Chats").classes("text-sm opacity-80")
-                ui.label(str(Chat.select().count())).classes("text-3xl font-bold")
+                ui.label(str(total_chats)).classes("text-3xl font-bold")
 
             with ui.card().classes("bg-purple-500 text-white"):
                 ui.label("Total Commands").classes("text-sm opacity-80")
-                ui.label(str(CommandLog.select().count())).classes("text-3xl font-bold")
-
-            today_start = int(
-                datetime.datetime.now().replace(hour=0, minute=0, second=0).timestamp()
-            )
-            commands_today = (
-                CommandLog.select().where(CommandLog.timestamp >= today_start).count()
-            )
+                ui.label(str(total_commands)).classes("text-3xl font-bold")
+
             with ui.card().classes("bg-orange-500 text-white"):
                 ui.label("Commands Today").classes("text-sm opacity-80")
                 ui.label(str(commands_today)).classes("text-3xl font-bold")
 
         # Recent commands
         ui.label("Recent Commands").classes("text-xl font-bold mt-6 mb-2")
-        recent_commands = (
-            CommandLog.select()
-            .order_by(CommandLog.timestamp.desc())
-            .limit(10)
-        )
         columns = [
             {"name": "time", "label": "Time", "field": "time", "align": "left"},
             {"name": "command", "label": "Command", "field": "command", "align": "left"},
@@ -117,59 +238,22 @@ def dashboard():
             {"name": "chat_name", "label": "Chat", "field": "chat_name", "align": "left"},
             {"name": "chat_type", "label": "Type", "field": "chat_type", "align": "left"},
         ]
-        rows = [
-            {
-                "time": format_timestamp(c.timestamp),
-                "command": c.command,
-                "username": c.username,
-                "args": c.args or "-",
-                "chat_name": c.chat.telegram_chat_name if c.chat else "-",
-                "chat_type": c.chat.chat_type if c.chat else "-",
-            }
-            for c in recent_commands
-        ]
+        rows = get_command_log_rows(command_log_query().limit(10))
         ui.table(columns=columns, rows=rows, row_key="time").classes("w-full")
 
 
-@ui.page("/users")
 def users_page():
     """Users management page."""
     if not check_auth():
         return ui.navigate.to("/login")
 
-    def refresh_table():
-        users = User.select().order_by(User.id.desc())
-        rows = [
-            {
-                "id": u.id,
-                "telegram_id": u.telegram_id,
-                "telegram_username": u.telegram_username or "-",
-                "lastfm_username": u.lastfm_username or "-",
-            }
-            for u in users
-        ]
-        table.rows = rows
-        table.update()
-
     def delete_user(user_id: int):
         User.delete().where(User.id == user_id).execute()
         ui.notify(f"User {user_id} deleted", type="positive")
-        refresh_table()
+        table.rows[:] = [row for row in table.rows if row["id"] != user_id]
+        table.update()
 
-    with ui.header().classes("bg-blue-600"):
-        ui.label("LastfmBucket Admin").classes("text-xl text-white font-bold")
-        ui.space()
-        with ui.row():
-            ui.button("Dashboard", on_click=lambda: ui.navigate.to("/")).props("flat color=white")
-            ui.button("Users", on_click=lambda: ui.navigate.to("/users")).props("flat color=white")
-            ui.button("Chats", on_click=lambda: ui.navigate.to("/chats")).props("flat color=white")
-            ui.button("Command Logs", on_click=lambda: ui.navigate.to("/logs")).props(
-                "flat color=white"
-            )
-            ui.button(
-                "Logout",
-                on_click=lambda: (app.storage.user.clear(), ui.navigate.to("/login")),
-            ).props("flat color=white")
+    render_header()
 
     with ui.column().classes("w-full p-4"):
         ui.label("Users").classes("text-2xl font-bold mb-4")
@@ -192,18 +276,7 @@ def users_page():
             {"name": "actions", "label": "Actions", "field": "actions", "align": "center"},
         ]
 
-        users = User.select().order_by(User.id.desc())
-        rows = [
-            {
-                "id": u.id,
-                "telegram_id": u.telegram_id,
-                "telegram_username": u.telegram_username or "-",
-                "lastfm_username": u.lastfm_username or "-",
-            }
-            for u in users
-        ]
-
-        table = ui.table(columns=columns, rows=rows, row_key="id").classes("w-full")
+        table = virtual_table(columns, get_user_rows(), "id")
         table.add_slot(
             "body-cell-actions",
             """
@@ -214,28 +287,15 @@ def users_page():
         """,
         )
         table.on("delete", lambda e: delete_user(e.args))
+        ui.button("Load more", on_click=lambda: load_more(table, get_user_rows))
 
 
-@ui.page("/chats")
 def chats_page():
     """Chats management page."""
     if not check_auth():
         return ui.navigate.to("/login")
 
-    with ui.header().classes("bg-blue-600"):
-        ui.label("LastfmBucket Admin").classes("text-xl text-white font-bold")
-        ui.space()
-        with ui.row():
-            ui.button("Dashboard", on_click=lambda: ui.navigate.to("/")).props("flat color=white")
-            ui.button("Users", on_click=lambda: ui.navigate.to("/users")).props("flat color=white")
-            ui.button("Chats", on_click=lambda: ui.navigate.to("/chats")).props("flat color=white")
-            ui.button("Command Logs", on_click=lambda: ui.navigate.to("/logs")).props(
-                "flat color=white"
-            )
-            ui.button(
-                "Logout",
-                on_click=lambda: (app.storage.user.clear(), ui.navigate.to("/login")),
-            ).props("flat color=white")
+    render_header()
 
     with ui.column().classes("w-full p-4"):
         ui.label("Chats").classes("text-2xl font-bold mb-4")
@@ -252,40 +312,16 @@ def chats_page():
             {"name": "chat_type", "label": "Type", "field": "chat_type", "align": "left"},
         ]
 
-        chats = Chat.select().order_by(Chat.id.desc())
-        rows = [
-            {
-                "id": c.id,
-                "telegram_id": c.telegram_id,
-                "telegram_chat_name": c.telegram_chat_name or "-",
-                "chat_type": c.chat_type or "-",
-            }
-            for c in chats
-        ]
+        table = virtual_table(columns, get_chat_rows(), "id")
+        ui.button("Load more", on_click=lambda: load_more(table, get_chat_rows))
 
-        ui.table(columns=columns, rows=rows, row_key="id").classes("w-full")
 
-
-@ui.page("/logs")
 def logs_page():
     """Command logs page."""
     if not check_auth():
         return ui.navigate.to("/login")
 
-    with ui.header().classes("bg-blue-600"):
-        ui.label("LastfmBucket Admin").classes("text-xl text-white font-bold")
-        ui.space()
-        with ui.row():
-            ui.button("Dashboard", on_click=lambda: ui.navigate.to("/")).props("flat color=white")
-            ui.button("Users", on_click=lambda: ui.navigate.to("/users")).props("flat color=white")
-            ui.button("Chats", on_click=lambda: ui.navigate.to("/chats")).props("flat color=white")
-            ui.button("Command Logs", on_click=lambda: ui.navigate.to("/logs")).props(
-                "flat color=white"
-            )
-            ui.button(
-                "Logout",
-                on_click=lambda: (app.storage.user.clear(), ui.navigate.to("/login")),
-            ).props("flat color=white")
+    render_header()
 
     with ui.column().classes("w-full p-4"):
         ui.label("Command Logs").classes("text-2xl font-bold mb-4")
@@ -295,27 +331,38 @@ def logs_page():
             command_filter = ui.input("Filter by command").classes("w-48")
             user_filter = ui.input("Filter by username").classes("w-48")
 
+            def load_page(pagination: dict):
+                """Fetch a single page of logs; Quasar requests the others."""
+                query = command_log_query()
+                # Counting needs neither the formatted columns nor the chat join
+                count_query = CommandLog.select(CommandLog.id)
+                if command_filter.value or user_filter.value:
+                    matches = CommandLogIndex.select(CommandLogIndex.rowid)
+                    if command_filter.value:
+                        matches = matches.where(
+                            CommandLogIndex.command.contains(command_filter.value)
+                        )
+                    if user_filter.value:
+                        matches = matches.where(
+                            CommandLogIndex.username.contains(user_filter.value)
+                        )
+                    query = query.where(CommandLog.id.in_(matches))
+                    count_query = count_query.where(CommandLog.id.in_(matches))
+
+                sort_field = LOG_SORT_FIELDS.get(pagination.get("sortBy"))
+                if sort_field is not None:
+                    query = query.order_by(
+                        sort_field.desc() if pagination.get("descending") else sort_field
+                    )
+
+                pagination = {**pagination, "rowsNumber": count_query.count()}
+                if pagination["rowsPerPage"]:  # 0 means "All"
+                    query = query.paginate(pagination["page"], pagination["rowsPerPage"])
+                table.rows = get_command_log_rows(query)
+                table.pagination = pagination
+
             def apply_filters():
-                query = CommandLog.select().order_by(CommandLog.timestamp.desc())
-                if command_filter.value:
-                    query = query.where(CommandLog.command.contains(command_filter.value))
-                if user_filter.value:
-                    query = query.where(CommandLog.username.contains(user_filter.value))
-                query = query.limit(100)
-
-                rows = [
-                    {
-                        "time": format_timestamp(c.timestamp),
-                        "command": c.command,
-                        "username": c.username or "-",
-                        "args": c.args or "-",
-                        "chat_name": c.chat.telegram_chat_name if c.chat else "-",
-                        "chat_type": c.chat.chat_type if c.chat else "-",
-                    }
-                    for c in query
-                ]
-                table.rows = rows
-                table.update()
+                load_page({**table.pagination, "page": 1})
 
             ui.button("Filter", on_click=apply_filters).props("color=primary")
             ui.button("Clear", on_click=lambda: (
@@ -351,26 +398,36 @@ def logs_page():
             },
         ]
 
-        logs = CommandLog.select().order_by(CommandLog.timestamp.desc()).limit(100)
-        rows = [
-            {
-                "time": format_timestamp(c.timestamp),
-                "command": c.command,
-                "username": c.username or "-",
-                "args": c.args or "-",
-                "chat_name": c.chat.telegram_chat_name if c.chat else "-",
-                "chat_type": c.chat.chat_type if c.chat else "-",
-            }
-            for c in logs
-        ]
+        table = ui.table(
+            columns=columns,
+            rows=[],
+            row_key="time",
+            pagination={"page": 1, "rowsPerPage": LOGS_PAGE_SIZE},
+        ).classes("w-full")
+        table.on("request", lambda e: load_page(e.args["pagination"]))
+        load_page(table.pagination)
 
-        table = ui.table(columns=columns, rows=rows, row_key="time", pagination=20).classes(
-            "w-full"
-        )
+
+ADMIN_PAGES = (
+    ("/login", login_page),
+    ("/", dashboard),
+    ("/users", users_page),
+    ("/chats", chats_page),
+    ("/logs", logs_page),
+)
+
+
+def register_pages() -> None:
+    """Register the admin routes; done at startup so importing stays cheap."""
+    for path, page in ADMIN_PAGES:
+        ui.page(path)(page)
 
 
 def run_admin():
     """Run the admin server."""
+    # Store for authenticated sessions
+    app.storage.secret = ADMIN_SECRET_KEY
+    register_pages()
     print(f"Starting admin dashboard on http://0.0.0.0:{ADMIN_PORT}")
     print(f"Login with username: {ADMIN_USERNAME}")
     ui.run(
@@ -6,6 +6,7 @@ Uses qwen2.5:0.5b - a tiny but capable model optimized for 2GB RAM.
 
 import logging
 import os
+import time
 
 import ollama
 
@@ -16,46 +17,73 @@ logger = logging.getLogger(__name__)
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
 MODEL_NAME = "qwen2.5:0.5b"
+# Seconds to trust a successful model check before asking Ollama again
+MODEL_CHECK_TTL = 600
 
-# Initialize Ollama client
-client = ollama.Client(host=OLLAMA_HOST)
+# Initialize Ollama client; async so generation never blocks the bot loop
+client = ollama.AsyncClient(host=OLLAMA_HOST)
 
+# Prompt templates, filled in with str.format()
+VIBE_PROMPT = """You are a music mood analyst. Based on these recently played songs, describe the listener's current vibe/mood in 2-3 sentences. Be creative, use emojis, and capture the emotional atmosphere.
 
-def ensure_model_exists() -> bool:
+{current}Recent tracks:
+{tracks}
+
+Describe the vibe:"""
+
+ROAST_PROMPT = """You are a witty music critic. Roast this person's music taste in a funny but not mean way. Keep it to 2-3 sentences max. Use emojis.
+
+Top artists: {artists}
+Top tracks: {tracks}
+
+Your roast:"""
+
+RECOMMEND_PROMPT = """Based on these favorite artists, recommend 5 similar artists they might not know. Format as a simple list with brief reasons.
+
+Favorite artists: {artists}
+
+Recommendations:"""
+
+# Generation options per prompt
+VIBE_OPTIONS = {"temperature": 0.8, "num_predict": 100}
+ROAST_OPTIONS = {"temperature": 0.9, "num_predict": 120}
+RECOMMEND_OPTIONS = {"temperature": 0.7, "num_predict": 150}
+
+# time.monotonic() of the last successful model check
+_model_ready_at: float | None = None
+
+
+async def ensure_model_exists() -> bool:
     """Pull the model if it doesn't exist. Returns True if ready."""
+    global _model_ready_at
+    if _model_ready_at is not None and time.monotonic() - _model_ready_at < MODEL_CHECK_TTL:
+        return True
     try:
-        models = client.list()
+        models = await client.list()
         model_names = [m.model for m in models.models] if models.models else []
         if MODEL_NAME not in model_names and f"{MODEL_NAME}:latest" not in model_names:
             logger.info(f"Pulling model {MODEL_NAME}...")
-            client.pull(MODEL_NAME)
+            await client.pull(MODEL_NAME)
             logger.info(f"Model {MODEL_NAME} pulled successfully")
+        _model_ready_at = time.monotonic()
         return True
     except Exception as e:
         logger.error(f"Failed to ensure model exists: {e}")
         return False
 
 
-def generate_vibe(recent_tracks: list[str], current_track: str | None = None) -> str:
+async def generate_vibe(recent_tracks: list[str], current_track: str | None = None) -> str:
     """Generate a vibe/mood description based on recent listening."""
-    if not ensure_model_exists():
+    if not await ensure_model_exists():
         return "AI is temporarily unavailable. Please try again later."
 
-    tracks_text = "\n".join(f"- {track}" for track in recent_tracks[:10])
+    tracks_text = "- " + "\n- ".join(recent_tracks[:10]) if recent_tracks else ""
     current = f"Currently playing: {current_track}\n" if current_track else ""
-
-    prompt = f"""You are a music mood analyst. Based on these recently played songs, describe the listener's current vibe/mood in 2-3 sentences. Be creative, use emojis, and capture the emotional atmosphere.
-
-{current}Recent tracks:
-{tracks_text}
-
-Describe the vibe:"""
+    prompt = VIBE_PROMPT.format(current=current, tracks=tracks_text)
 
     try:
-        response = client.generate(
-            model=MODEL_NAME,
-            prompt=prompt,
-            options={"temperature": 0.8, "num_predict": 100},
+        response = await client.generate(
+            model=MODEL_NAME, prompt=prompt, options=VIBE_OPTIONS
         )
         return response.response.strip()
     except Exception as e:
@@ -63,26 +91,18 @@ Describe the vibe:"""
         return "Couldn't analyze your vibe right now. Try again later!"
 
 
-def generate_roast(top_artists: list[str], top_tracks: list[str]) -> str:
+async def generate_roast(top_artists: list[str], top_tracks: list[str]) -> str:
     """Generate a humorous roast of the user's music taste."""
-    if not ensure_model_exists():
+    if not await ensure_model_exists():
         return "AI is temporarily unavailable. Please try again later."
 
-    artists_text = ", ".join(top_artists[:10])
-    tracks_text = ", ".join(top_tracks[:5])
-
-    prompt = f"""You are a witty music critic. Roast this person's music taste in a funny but not mean way. Keep it to 2-3 sentences max. Use emojis.
-
-Top artists: {artists_text}
-Top tracks: {tracks_text}
-
-Your roast:"""
+    prompt = ROAST_PROMPT.format(
+        artists=", ".join(top_artists[:10]), tracks=", ".join(top_tracks[:5])
+    )
 
     try:
-        response = client.generate(
-            model=MODEL_NAME,
-            prompt=prompt,
-            options={"temperature": 0.9, "num_predict": 120},
+        response = await client.generate(
+            model=MODEL_NAME, prompt=prompt, options=ROAST_OPTIONS
         )
         return response.response.strip()
     except Exception as e:
@@ -90,24 +110,16 @@ Your roast:"""
         return "My roasting circuits are fried. Try again later! 🔥"
 
 
-def generate_recommendations(top_artists: list[str]) -> str:
+async def generate_recommendations(top_artists: list[str]) -> str:
     """Generate music recommendations based on top artists."""
-    if not ensure_model_exists():
+    if not await ensure_model_exists():
         return "AI is temporarily unavailable. Please try again later."
 
-    artists_text = ", ".join(top_artists[:10])
-
-    prompt = f"""Based on these favorite artists, recommend 5 similar artists they might not know. Format as a simple list with brief reasons.
-
-Favorite artists: {artists_text}
-
-Recommendations:"""
+    prompt = RECOMMEND_PROMPT.format(artists=", ".join(top_artists[:10]))
 
     try:
-        response = client.generate(
-            model=MODEL_NAME,
-            prompt=prompt,
-            options={"temperature": 0.7, "num_predict": 150},
+        response = await client.generate(
+            model=MODEL_NAME, prompt=prompt, options=RECOMMEND_OPTIONS
         )
         return response.response.strip()
     except Exception as e:
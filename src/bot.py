@@ -1,8 +1,15 @@
+import asyncio
+import contextlib
 import logging
 
 import sentry_sdk
-from dotenv import load_dotenv
-from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler
+from telegram.ext import (
+    Application,
+    ApplicationBuilder,
+    CallbackQueryHandler,
+    CommandHandler,
+    ContextTypes,
+)
 
 import commands
 import config
@@ -14,12 +21,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+
+async def post_init(app: Application) -> None:
+    """Starts background tasks once the bot's event loop is running."""
+    app.bot_data["command_log_flusher"] = asyncio.create_task(
+        commands.flush_command_logs()
+    )
+
+
+async def post_shutdown(app: Application) -> None:
+    """Stops background tasks, writes pending command logs and closes Last.fm."""
+    flusher = app.bot_data.pop("command_log_flusher", None)
+    if flusher:
+        flusher.cancel()
+        # Let its final batch write finish before draining what's left
+        with contextlib.suppress(asyncio.CancelledError):
+            await flusher
+    await commands.drain_command_logs()
+    # Closing the pool can block on open sockets, so keep it off the event loop
+    await asyncio.to_thread(app.bot_data["lastfm_client"].close)
 
 
 def main() -> None:
     """Starts the bot."""
-    app = ApplicationBuilder().token(config.TELEGRAM_BOT_TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .context_types(ContextTypes(context=commands.BotContext))
+        # Handlers mostly wait on Last.fm, so one user's slow reply shouldn't
+        # hold up everyone else's updates
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     sentry_sdk.init(
         dsn=config.SENTRY_DSN,
@@ -34,6 +69,7 @@ def main() -> None:
     view_service = ViewService(lastfm_service)
 
     # Add services to bot_data
+    app.bot_data["lastfm_client"] = lastfm_client
     app.bot_data["lastfm_service"] = lastfm_service
     app.bot_data["view_service"] = view_service
 
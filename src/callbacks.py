@@ -6,25 +6,38 @@ This module centralizes all callback handling:
 - Compact encoding/decoding (must fit in 64 bytes)
 - Type-safe payload parsing
 
-Format: "v|action|owner_id|entity|period"
-Example: "1|t|123456789|a|w" = tops, user 123456789, artist, week
+Format: base64url(struct "<BBqBB": version, action, owner_id, entity, period)
+Actions, entities and periods are stored as their position in the enum
+(entity and period are offset by one so 0 means "not set"), which gives a
+fixed 16 character payload.
+Example: "AgQVzVsHAAAAAAEB" = tops, user 123456789, artist, week
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import base64
+import functools
+import struct
 from enum import StrEnum
-from typing import TYPE_CHECKING, Optional
+from typing import Optional
 
-if TYPE_CHECKING:
-    import lastfm
+import lastfm
 
-SEP = "|"
-VERSION = "1"
+VERSION = 2
+PAYLOAD = struct.Struct("<BBqBB")
+
+# Every payload encodes to the same ASCII length, so check Telegram's 64 byte
+# callback_data limit once here instead of on every encode
+ENCODED_LENGTH = len(base64.urlsafe_b64encode(bytes(PAYLOAD.size)))
+assert ENCODED_LENGTH <= 64, f"Callback too long: {ENCODED_LENGTH} bytes"
 
 
 class Action(StrEnum):
-    """Short codes for callback actions."""
+    """
+    Short codes for callback actions.
+
+    Members are encoded by position: only ever append new ones.
+    """
 
     NP_LESS = "nl"
     NP_LESS_COVER = "nc"
@@ -34,7 +47,7 @@ class Action(StrEnum):
 
 
 class Entity(StrEnum):
-    """Short codes for top entity types."""
+    """Short codes for top entity types (encoded by position, append only)."""
 
     ARTIST = "a"
     ALBUM = "b"
@@ -42,7 +55,7 @@ class Entity(StrEnum):
 
 
 class Period(StrEnum):
-    """Short codes for time periods."""
+    """Short codes for time periods (encoded by position, append only)."""
 
     WEEK = "w"
     MONTH_1 = "1"
@@ -52,7 +65,37 @@ class Period(StrEnum):
     OVERALL = "o"
 
 
-@dataclass(frozen=True, slots=True)
+TO_LASTFM_ENTITY = {
+    Entity.ARTIST: lastfm.EntityType.ARTIST,
+    Entity.ALBUM: lastfm.EntityType.ALBUM,
+    Entity.TRACK: lastfm.EntityType.TRACK,
+}
+TO_LASTFM_PERIOD = {
+    Period.WEEK: lastfm.Period.WEEK,
+    Period.MONTH_1: lastfm.Period.ONE_MONTH,
+    Period.MONTH_3: lastfm.Period.THREE_MONTHS,
+    Period.MONTH_6: lastfm.Period.SIX_MONTHS,
+    Period.YEAR: lastfm.Period.YEAR,
+    Period.OVERALL: lastfm.Period.OVERALL,
+}
+FROM_LASTFM_ENTITY = {v: k for k, v in TO_LASTFM_ENTITY.items()}
+FROM_LASTFM_PERIOD = {v: k for k, v in TO_LASTFM_PERIOD.items()}
+
+ACTIONS = tuple(Action)
+ENTITIES = (None, *Entity)
+PERIODS = (None, *Period)
+ACTION_IDS = {action: i for i, action in enumerate(ACTIONS)}
+ENTITY_IDS = {entity: i for i, entity in enumerate(ENTITIES)}
+PERIOD_IDS = {period: i for i, period in enumerate(PERIODS)}
+
+
+@functools.lru_cache(maxsize=8192)
+def encode_payload(action_id: int, owner_id: int, entity_id: int, period_id: int) -> str:
+    """Packs and base64url-encodes a payload; keyboards repeat the same few per user."""
+    packed = PAYLOAD.pack(VERSION, action_id, owner_id, entity_id, period_id)
+    return base64.urlsafe_b64encode(packed).decode("ascii")
+
+
 class Callback:
     """
     Typed representation of callback data.
@@ -61,104 +104,99 @@ class Callback:
     - action: what to do
     - owner_id: the telegram user whose data to show (fixes the group bug)
     - entity/period: optional parameters for tops command
+
+    Instances are treated as immutable so the encoded form can be cached.
     """
 
-    action: Action
-    owner_id: int
-    entity: Optional[Entity] = None
-    period: Optional[Period] = None
+    __slots__ = ("action", "owner_id", "entity", "period", "_action_id", "_encoded")
+
+    def __init__(
+        self,
+        action: Action,
+        owner_id: int,
+        entity: Optional[Entity] = None,
+        period: Optional[Period] = None,
+    ):
+        self.action = action
+        self.owner_id = owner_id
+        self.entity = entity
+        self.period = period
+        self._action_id: Optional[int] = None
+        self._encoded: Optional[str] = None
+
+    def _key(self) -> tuple:
+        return self.action, self.owner_id, self.entity, self.period
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Callback):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return (
+            f"Callback(action={self.action!r}, owner_id={self.owner_id!r}, "
+            f"entity={self.entity!r}, period={self.period!r})"
+        )
+
+    @property
+    def action_id(self) -> int:
+        """Position of ``action`` in ``ACTIONS``, as stored in the payload."""
+        if self._action_id is None:
+            self._action_id = ACTION_IDS[self.action]
+        return self._action_id
 
     def encode(self) -> str:
         """Encode to compact string format for Telegram callback_data."""
-        parts = [
-            VERSION,
-            self.action,
-            str(self.owner_id),
-            self.entity or "",
-            self.period or "",
-        ]
-        encoded = SEP.join(parts)
-        assert len(encoded.encode("utf-8")) <= 64, f"Callback too long: {encoded}"
-        return encoded
+        if self._encoded is None:
+            self._encoded = encode_payload(
+                self.action_id,
+                self.owner_id,
+                ENTITY_IDS[self.entity],
+                PERIOD_IDS[self.period],
+            )
+        return self._encoded
 
     @classmethod
     def decode(cls, data: str) -> Optional[Callback]:
         """Decode callback data string to typed Callback object."""
+        if len(data) != ENCODED_LENGTH:
+            return None
         try:
-            parts = data.split(SEP)
-            if len(parts) < 3:
-                return None
-
-            version = parts[0]
+            packed = base64.b64decode(data, altchars=b"-_", validate=True)
+            version, action, owner_id, entity, period = PAYLOAD.unpack(packed)
             if version != VERSION:
                 return None
 
-            action = Action(parts[1])
-            owner_id = int(parts[2])
-            entity = Entity(parts[3]) if len(parts) > 3 and parts[3] else None
-            period = Period(parts[4]) if len(parts) > 4 and parts[4] else None
-
-            return cls(
-                action=action,
+            cb = cls(
+                action=ACTIONS[action],
                 owner_id=owner_id,
-                entity=entity,
-                period=period,
+                entity=ENTITIES[entity],
+                period=PERIODS[period],
             )
-        except (ValueError, IndexError):
+            cb._action_id = action
+            cb._encoded = data
+            return cb
+        # binascii.Error (bad padding/alphabet) and non-ASCII input are ValueErrors
+        except (ValueError, struct.error, IndexError):
             return None
 
     def to_lastfm_entity(self) -> Optional[lastfm.EntityType]:
         """Convert callback Entity to lastfm.EntityType."""
-        import lastfm as lfm
-
-        if self.entity is None:
-            return None
-        mapping = {
-            Entity.ARTIST: lfm.EntityType.ARTIST,
-            Entity.ALBUM: lfm.EntityType.ALBUM,
-            Entity.TRACK: lfm.EntityType.TRACK,
-        }
-        return mapping.get(self.entity)
+        return TO_LASTFM_ENTITY.get(self.entity)
 
     def to_lastfm_period(self) -> Optional[lastfm.Period]:
         """Convert callback Period to lastfm.Period."""
-        import lastfm as lfm
-
-        if self.period is None:
-            return None
-        mapping = {
-            Period.WEEK: lfm.Period.WEEK,
-            Period.MONTH_1: lfm.Period.ONE_MONTH,
-            Period.MONTH_3: lfm.Period.THREE_MONTHS,
-            Period.MONTH_6: lfm.Period.SIX_MONTHS,
-            Period.YEAR: lfm.Period.YEAR,
-            Period.OVERALL: lfm.Period.OVERALL,
-        }
-        return mapping.get(self.period)
+        return TO_LASTFM_PERIOD.get(self.period)
 
 
 def entity_from_lastfm(entity_type: lastfm.EntityType) -> Entity:
     """Convert lastfm.EntityType to callback Entity."""
-    import lastfm as lfm
-
-    mapping = {
-        lfm.EntityType.ARTIST: Entity.ARTIST,
-        lfm.EntityType.ALBUM: Entity.ALBUM,
-        lfm.EntityType.TRACK: Entity.TRACK,
-    }
-    return mapping[entity_type]
+    return FROM_LASTFM_ENTITY[entity_type]
 
 
 def period_from_lastfm(period: lastfm.Period) -> Period:
     """Convert lastfm.Period to callback Period."""
-    import lastfm as lfm
-
-    mapping = {
-        lfm.Period.WEEK: Period.WEEK,
-        lfm.Period.ONE_MONTH: Period.MONTH_1,
-        lfm.Period.THREE_MONTHS: Period.MONTH_3,
-        lfm.Period.SIX_MONTHS: Period.MONTH_6,
-        lfm.Period.YEAR: Period.YEAR,
-        lfm.Period.OVERALL: Period.OVERALL,
-    }
-    return mapping[period]
+    return FROM_LASTFM_PERIOD[period]
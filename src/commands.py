@@ -4,20 +4,23 @@ Telegram bot command handlers.
 This module contains handlers for commands and callback queries.
 """
 
+import asyncio
 import functools
 import logging
-from typing import Callable, Optional
+import time
+from typing import Awaitable, Callable, Optional
 
 import telegram.constants
-from dotenv import load_dotenv
+import telegram.error
 from emoji import emojize
 from telegram import LinkPreviewOptions, Update
-from telegram.ext import ContextTypes
+from telegram.ext import CallbackContext, ExtBot
 
 import db
 import ai
 import lastfm
-from callbacks import Action, Callback
+from cache import TTLCache
+from callbacks import ACTIONS, Action, Callback
 from services import ViewService
 
 logging.basicConfig(
@@ -25,27 +28,76 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+
+class BotContext(CallbackContext[ExtBot, dict, dict, dict]):
+    """Callback context exposing the bot's shared services as attributes."""
+
+    @property
+    def view_service(self) -> ViewService:
+        return self.bot_data["view_service"]
+
+
+# Command logs are buffered here and written in batches by flush_command_logs()
+COMMAND_LOG_QUEUE: asyncio.Queue[dict] = asyncio.Queue()
+COMMAND_LOG_BATCH_SIZE = 100
+COMMAND_LOG_FLUSH_INTERVAL = 2  # seconds
+
+
+async def flush_command_logs() -> None:
+    """Write queued command logs to the database in batches, forever."""
+    loop = asyncio.get_running_loop()
+    while True:
+        entries = [await COMMAND_LOG_QUEUE.get()]
+        deadline = loop.time() + COMMAND_LOG_FLUSH_INTERVAL
+        try:
+            while len(entries) < COMMAND_LOG_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entries.append(
+                        await asyncio.wait_for(COMMAND_LOG_QUEUE.get(), timeout)
+                    )
+                except TimeoutError:
+                    break
+        finally:
+            # Also runs on cancellation so collected entries aren't lost
+            try:
+                await db.write(db.log_commands, entries)
+            except Exception:
+                logger.exception("Failed to write %d command logs", len(entries))
+
+
+async def drain_command_logs() -> None:
+    """Write whatever is still queued; used on shutdown."""
+    entries = []
+    while not COMMAND_LOG_QUEUE.empty():
+        entries.append(COMMAND_LOG_QUEUE.get_nowait())
+    if entries:
+        await db.write(db.log_commands, entries)
 
 
 def log_command(command_name: str) -> Callable:
-    """Decorator to log command executions to the database."""
+    """Decorator to queue command executions for logging to the database."""
 
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         async def wrapper(
-            update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs
+            update: Update, context: BotContext, *args, **kwargs
         ):
             message = update.message
             if message and message.from_user:
-                db.log_command(
-                    user_id=message.from_user.id,
-                    username=message.from_user.username or "",
-                    command=command_name,
-                    args=" ".join(context.args) if context.args else "",
-                    chat_id=message.chat_id,
-                    chat_type=message.chat.type,
-                    chat_name=message.chat.title or message.chat.username or "",
+                COMMAND_LOG_QUEUE.put_nowait(
+                    {
+                        "user_id": message.from_user.id,
+                        "username": message.from_user.username or "",
+                        "command": command_name,
+                        "args": " ".join(context.args) if context.args else "",
+                        "chat_id": message.chat_id,
+                        "chat_type": message.chat.type,
+                        "chat_name": message.chat.title or message.chat.username or "",
+                        "timestamp": int(time.time()),
+                    }
                 )
             return await func(update, context, *args, **kwargs)
 
@@ -69,88 +121,118 @@ VIBE_COMMAND = "vibe"
 ROAST_COMMAND = "roast"
 RECOMMEND_COMMAND = "recommend"
 
+# Shared by every reply; PTB's telegram objects are immutable
+NO_LINK_PREVIEW = LinkPreviewOptions(is_disabled=True)
 
-async def _handle_np_less(
-    update: Update, context: ContextTypes.DEFAULT_TYPE, cb: Callback
-) -> None:
-    await now_playing(update, context, telegram_user_id=cb.owner_id)
-
+# Seconds to reuse the bot description fetched for /help
+HELP_TEXT_TTL = 3600
 
-async def _handle_np_less_cover(
-    update: Update, context: ContextTypes.DEFAULT_TYPE, cb: Callback
-) -> None:
-    await now_playing(update, context, show_cover=True, telegram_user_id=cb.owner_id)
-
-
-async def _handle_np_more(
-    update: Update, context: ContextTypes.DEFAULT_TYPE, cb: Callback
-) -> None:
-    await status(update, context, show_cover=True, telegram_user_id=cb.owner_id)
+# Telegram file_id of each album cover already uploaded, keyed by cover URL, so
+# repeated covers are sent by reference instead of re-downloaded by Telegram
+COVER_FILE_IDS = TTLCache(maxsize=4096, ttl=86400)
+# Parts of Telegram's BadRequest messages that mean a stored file_id is unusable
+DEAD_FILE_ID_ERRORS = ("wrong file identifier", "wrong remote file")
 
 
-async def _handle_pref_unlink(
-    update: Update, context: ContextTypes.DEFAULT_TYPE, cb: Callback
+async def edit_cover(
+    message: telegram.Message,
+    cover_url: str,
+    caption: str,
+    reply_markup: telegram.InlineKeyboardMarkup,
 ) -> None:
-    await unlink_account(update, context, telegram_user_id=cb.owner_id)
+    """Shows the album cover on ``message``, reusing Telegram's copy when it has one."""
+    file_id = COVER_FILE_IDS.get(cover_url)
+    try:
+        edited = await message.edit_media(
+            telegram.InputMediaPhoto(
+                media=file_id or cover_url,
+                caption=caption,
+                parse_mode=telegram.constants.ParseMode.HTML,
+            ),
+            reply_markup=reply_markup,
+        )
+    except telegram.error.BadRequest as e:
+        error = e.message.lower()
+        if not file_id or not any(dead in error for dead in DEAD_FILE_ID_ERRORS):
+            raise
+        # The stored file_id is no longer valid; send the URL again
+        COVER_FILE_IDS.pop(cover_url)
+        await edit_cover(message, cover_url, caption, reply_markup)
+        return
+    if not file_id and isinstance(edited, telegram.Message) and edited.photo:
+        COVER_FILE_IDS.set(cover_url, edited.photo[-1].file_id)
 
 
-async def _handle_tops(
-    update: Update, context: ContextTypes.DEFAULT_TYPE, cb: Callback
-) -> None:
-    entity_type = cb.to_lastfm_entity()
-    period = cb.to_lastfm_period()
-    await tops(
+def _handle_tops(
+    update: Update, context: BotContext, cb: Callback
+) -> Awaitable[None]:
+    return tops(
         update,
         context,
         telegram_user_id=cb.owner_id,
-        entity_type=entity_type,
-        period=period,
+        entity_type=cb.to_lastfm_entity(),
+        period=cb.to_lastfm_period(),
     )
 
 
-CALLBACK_ROUTES = {
-    Action.NP_LESS: _handle_np_less,
-    Action.NP_LESS_COVER: _handle_np_less_cover,
-    Action.NP_MORE: _handle_np_more,
-    Action.PREF_UNLINK: _handle_pref_unlink,
+# Each route returns the handler's coroutine directly; button_handler awaits it
+_ROUTES_BY_ACTION = {
+    Action.NP_LESS: lambda update, context, cb: now_playing(
+        update, context, telegram_user_id=cb.owner_id
+    ),
+    Action.NP_LESS_COVER: lambda update, context, cb: now_playing(
+        update, context, show_cover=True, telegram_user_id=cb.owner_id
+    ),
+    Action.NP_MORE: lambda update, context, cb: status(
+        update, context, show_cover=True, telegram_user_id=cb.owner_id
+    ),
+    Action.PREF_UNLINK: lambda update, context, cb: unlink_account(
+        update, context, telegram_user_id=cb.owner_id
+    ),
     Action.TOPS: _handle_tops,
 }
+# Indexed by Callback.action_id, so dispatch needs no enum hashing
+CALLBACK_ROUTES = tuple(_ROUTES_BY_ACTION.get(action) for action in ACTIONS)
 
 
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def button_handler(update: Update, context: BotContext) -> None:
     """Route callback queries to appropriate handlers using typed Callback data."""
     query = update.callback_query
     await query.answer()
 
-    cb = Callback.decode(query.data or "")
+    if not query.data:
+        logger.error("Empty callback data")
+        return
+
+    cb = Callback.decode(query.data)
     if not cb:
-        logger.error(f"Invalid callback data: {query.data}")
+        logger.error("Invalid callback data: %s", query.data)
         return
 
-    handler = CALLBACK_ROUTES.get(cb.action)
+    handler = CALLBACK_ROUTES[cb.action_id]
     if not handler:
-        logger.error(f"No handler for action: {cb.action} (data: {query.data})")
+        logger.error("No handler for action: %s (data: %s)", cb.action, query.data)
         return
 
     await handler(update, context, cb)
 
 
 @log_command(START_COMMAND)
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def start(update: Update, context: BotContext) -> None:
     """Sends a welcome message to the user."""
     logger.info(
-        f"username: {update.message.from_user.username} "
-        f"- id: {update.message.from_user.id} started a private chat with the bot"
+        "username: %s - id: %s started a private chat with the bot",
+        update.message.from_user.username,
+        update.message.from_user.id,
     )
-    view_service: ViewService = context.bot_data["view_service"]
-    response = await view_service.build_start_response(update.message.from_user)
+    response = await context.view_service.build_start_response(update.message.from_user)
     await update.message.reply_text(response)
 
 
 @log_command(NOW_PLAYING_COMMAND)
 async def now_playing(
     update: Update,
-    context: ContextTypes.DEFAULT_TYPE,
+    context: BotContext,
     show_cover: bool = False,
     telegram_user_id: Optional[int] = None,
 ) -> None:
@@ -159,53 +241,45 @@ async def now_playing(
     message = update.callback_query.message if from_button else update.message
     user_id = telegram_user_id or update.message.from_user.id
 
-    view_service: ViewService = context.bot_data["view_service"]
-    response, reply_markup, cover_url = await view_service.build_np_response(
+    response, reply_markup, cover_url = await context.view_service.build_np_response(
         user_id, show_cover
     )
 
     if from_button and show_cover:
         if cover_url:
-            await message.edit_media(
-                telegram.InputMediaPhoto(
-                    media=cover_url,
-                    caption=response,
-                    parse_mode=telegram.constants.ParseMode.HTML,
-                ),
-                reply_markup=reply_markup,
-            )
+            await edit_cover(message, cover_url, response, reply_markup)
         else:
             # No cover available - just edit the text and remove the cover button
             await message.edit_text(
                 response,
                 reply_markup=reply_markup,
                 parse_mode=telegram.constants.ParseMode.HTML,
-                link_preview_options=LinkPreviewOptions(is_disabled=True),
+                link_preview_options=NO_LINK_PREVIEW,
             )
     else:
         await message.reply_html(
             response,
             reply_markup=reply_markup,
-            link_preview_options=LinkPreviewOptions(is_disabled=True),
+            link_preview_options=NO_LINK_PREVIEW,
         )
 
 
 @log_command(SET_COMMAND)
 async def lastfm_username_set(
-    update: Update, context: ContextTypes.DEFAULT_TYPE
+    update: Update, context: BotContext
 ) -> None:
     """Sets the user's Last.fm username."""
     logger.info(
-        f"username: {update.message.from_user.username} "
-        f"- issued command: {update.message.text}"
+        "username: %s - issued command: %s",
+        update.message.from_user.username,
+        update.message.text,
     )
     if not context.args:
         await update.message.reply_text("Please provide a Last.fm username.")
         return
 
     lastfm_username = context.args[0]
-    view_service: ViewService = context.bot_data["view_service"]
-    response = await view_service.build_lastfm_username_set_response(
+    response = await context.view_service.build_lastfm_username_set_response(
         telegram_user=update.message.from_user, lastfm_username=lastfm_username
     )
     await update.message.reply_text(response)
@@ -214,7 +288,7 @@ async def lastfm_username_set(
 @log_command(STATUS_COMMAND)
 async def status(
     update: Update,
-    context: ContextTypes.DEFAULT_TYPE,
+    context: BotContext,
     show_cover: bool = False,
     telegram_user_id: Optional[int] = None,
 ) -> None:
@@ -223,32 +297,25 @@ async def status(
     message = update.callback_query.message if from_button else update.message
     user_id = telegram_user_id or update.message.from_user.id
 
-    view_service: ViewService = context.bot_data["view_service"]
+    view_service = context.view_service
     response, reply_markup, cover_url = await view_service.build_status_response(
         user_id, show_cover
     )
 
     if from_button and show_cover:
-        await message.edit_media(
-            telegram.InputMediaPhoto(
-                media=cover_url,
-                caption=response,
-                parse_mode=telegram.constants.ParseMode.HTML,
-            ),
-            reply_markup=reply_markup,
-        )
+        await edit_cover(message, cover_url, response, reply_markup)
     else:
         await message.reply_html(
             response,
             reply_markup=reply_markup,
-            link_preview_options=LinkPreviewOptions(is_disabled=True),
+            link_preview_options=NO_LINK_PREVIEW,
         )
 
 
 @log_command(TOPS_COMMAND)
 async def tops(
     update: Update,
-    context: ContextTypes.DEFAULT_TYPE,
+    context: BotContext,
     telegram_user_id: Optional[int] = None,
     entity_type: Optional[lastfm.EntityType] = None,
     period: Optional[lastfm.Period] = None,
@@ -258,15 +325,17 @@ async def tops(
 
     if from_button:
         logger.info(
-            f"username: {update.callback_query.from_user.username} "
-            f"- pressed button: {update.callback_query.data}"
+            "username: %s - pressed button: %s",
+            update.callback_query.from_user.username,
+            update.callback_query.data,
         )
         message = update.callback_query.message
         user_id = telegram_user_id
     else:
         logger.info(
-            f"username: {update.message.from_user.username} "
-            f"- issued command: {update.message.text}"
+            "username: %s - issued command: %s",
+            update.message.from_user.username,
+            update.message.text,
         )
         message = update.message
         user_id = update.message.from_user.id
@@ -274,8 +343,7 @@ async def tops(
         if context.args:
             entity_type, period = _parse_tops_args(context.args)
 
-    view_service: ViewService = context.bot_data["view_service"]
-    response, reply_markup = await view_service.build_tops_response(
+    response, reply_markup = await context.view_service.build_tops_response(
         user_id, entity_type, period
     )
 
@@ -284,16 +352,42 @@ async def tops(
             response,
             reply_markup=reply_markup,
             parse_mode=telegram.constants.ParseMode.HTML,
-            link_preview_options=LinkPreviewOptions(is_disabled=True),
+            link_preview_options=NO_LINK_PREVIEW,
         )
     else:
         await message.reply_html(
             response,
             reply_markup=reply_markup,
-            link_preview_options=LinkPreviewOptions(is_disabled=True),
+            link_preview_options=NO_LINK_PREVIEW,
         )
 
 
+# Accepted /tops arguments
+TOPS_ENTITY_ARGS = {
+    "artists": lastfm.EntityType.ARTIST,
+    "artist": lastfm.EntityType.ARTIST,
+    "albums": lastfm.EntityType.ALBUM,
+    "album": lastfm.EntityType.ALBUM,
+    "tracks": lastfm.EntityType.TRACK,
+    "track": lastfm.EntityType.TRACK,
+}
+TOPS_PERIOD_ARGS = {
+    "1week": lastfm.Period.WEEK,
+    "week": lastfm.Period.WEEK,
+    "1month": lastfm.Period.ONE_MONTH,
+    "month": lastfm.Period.ONE_MONTH,
+    "3months": lastfm.Period.THREE_MONTHS,
+    "3month": lastfm.Period.THREE_MONTHS,
+    "6months": lastfm.Period.SIX_MONTHS,
+    "6month": lastfm.Period.SIX_MONTHS,
+    "12months": lastfm.Period.YEAR,
+    "12month": lastfm.Period.YEAR,
+    "year": lastfm.Period.YEAR,
+    "overall": lastfm.Period.OVERALL,
+    "alltime": lastfm.Period.OVERALL,
+}
+
+
 def _parse_tops_args(
     args: list[str],
 ) -> tuple[Optional[lastfm.EntityType], Optional[lastfm.Period]]:
@@ -302,46 +396,23 @@ def _parse_tops_args(
     period = None
 
     if args:
-        entity_map = {
-            "artists": lastfm.EntityType.ARTIST,
-            "artist": lastfm.EntityType.ARTIST,
-            "albums": lastfm.EntityType.ALBUM,
-            "album": lastfm.EntityType.ALBUM,
-            "tracks": lastfm.EntityType.TRACK,
-            "track": lastfm.EntityType.TRACK,
-        }
-        entity_type = entity_map.get(args[0].lower())
+        entity_type = TOPS_ENTITY_ARGS.get(args[0].lower())
 
     if len(args) > 1:
-        period_map = {
-            "1week": lastfm.Period.WEEK,
-            "week": lastfm.Period.WEEK,
-            "1month": lastfm.Period.ONE_MONTH,
-            "month": lastfm.Period.ONE_MONTH,
-            "3months": lastfm.Period.THREE_MONTHS,
-            "3month": lastfm.Period.THREE_MONTHS,
-            "6months": lastfm.Period.SIX_MONTHS,
-            "6month": lastfm.Period.SIX_MONTHS,
-            "12months": lastfm.Period.YEAR,
-            "12month": lastfm.Period.YEAR,
-            "year": lastfm.Period.YEAR,
-            "overall": lastfm.Period.OVERALL,
-            "alltime": lastfm.Period.OVERALL,
-        }
-        period = period_map.get(args[1].lower())
+        period = TOPS_PERIOD_ARGS.get(args[1].lower())
 
     return entity_type, period
 
 
 @log_command(PREFERENCES_COMMAND)
-async def preferences(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def preferences(update: Update, context: BotContext) -> None:
     """Displays user preferences options."""
     logger.info(
-        f"username: {update.message.from_user.username} "
-        f"- issued command: {update.message.text}"
+        "username: %s - issued command: %s",
+        update.message.from_user.username,
+        update.message.text,
     )
-    view_service: ViewService = context.bot_data["view_service"]
-    response, reply_markup = await view_service.build_preferences_response(
+    response, reply_markup = await context.view_service.build_preferences_response(
         update.message.from_user.id
     )
     await update.message.reply_html(response, reply_markup=reply_markup)
@@ -349,58 +420,66 @@ async def preferences(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
 async def unlink_account(
     update: Update,
-    context: ContextTypes.DEFAULT_TYPE,
+    context: BotContext,
     telegram_user_id: Optional[int] = None,
 ) -> None:
     """Unlinks a user's Last.fm account."""
     query = update.callback_query
     user_id = telegram_user_id or query.from_user.id
-    view_service: ViewService = context.bot_data["view_service"]
-    response = view_service.build_preferences_unlink_account_response(user_id)
+    view_service = context.view_service
+    response = await view_service.build_preferences_unlink_account_response(user_id)
     await query.edit_message_text(text=response)
 
 
 @log_command(HELP_COMMAND)
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def help_command(update: Update, context: BotContext) -> None:
     """Shows the bot's description as help text."""
     logger.info(
-        f"username: {update.message.from_user.username} "
-        f"- issued command: {update.message.text}"
+        "username: %s - issued command: %s",
+        update.message.from_user.username,
+        update.message.text,
     )
-    bot_description = (await context.bot.get_my_description()).description
-    await update.message.reply_text(emojize(bot_description))
+    cached = context.bot_data.get("help_text")
+    if cached and time.monotonic() - cached[1] < HELP_TEXT_TTL:
+        help_text = cached[0]
+    else:
+        bot_description = (await context.bot.get_my_description()).description
+        help_text = emojize(bot_description)
+        context.bot_data["help_text"] = (help_text, time.monotonic())
+    await update.message.reply_text(help_text)
 
 
 @log_command(CHANGELOG_COMMAND)
-async def changelog(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def changelog(update: Update, context: BotContext) -> None:
     """Displays the changelog."""
     logger.info(
-        f"username: {update.message.from_user.username} "
-        f"- issued command: {update.message.text}"
+        "username: %s - issued command: %s",
+        update.message.from_user.username,
+        update.message.text,
     )
-    view_service: ViewService = context.bot_data["view_service"]
-    response = await view_service.build_changelog_response()
+    response = await context.view_service.build_changelog_response()
     await update.message.reply_html(response)
 
 
 @log_command(PRIVACY_COMMAND)
-async def privacy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def privacy(update: Update, context: BotContext) -> None:
     """Displays the privacy policy."""
     logger.info(
-        f"username: {update.message.from_user.username} "
-        f"- issued command: {update.message.text}"
+        "username: %s - issued command: %s",
+        update.message.from_user.username,
+        update.message.text,
     )
-    view_service: ViewService = context.bot_data["view_service"]
-    message = await view_service.build_privacy_response()
+    message = await context.view_service.build_privacy_response()
     await update.message.reply_html(message)
 
 
 @log_command(COMPARE_COMMAND)
-async def compare(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def compare(update: Update, context: BotContext) -> None:
     """Compares listening stats between the user and another Last.fm user."""
     logger.info(
-        f"username: {update.message.from_user.username} "
-        f"- issued command: {update.message.text}"
+        "username: %s - issued command: %s",
+        update.message.from_user.username,
+        update.message.text,
     )
     if not context.args:
         await update.message.reply_text(
@@ -409,25 +488,25 @@ async def compare(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         return
 
     other_username = context.args[0]
-    view_service: ViewService = context.bot_data["view_service"]
-    response = await view_service.build_compare_response(
+    response = await context.view_service.build_compare_response(
         update.message.from_user.id, other_username
     )
     await update.message.reply_html(response)
 
 
 @log_command(VIBE_COMMAND)
-async def vibe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def vibe(update: Update, context: BotContext) -> None:
     """Generates an AI description of the user's current listening vibe."""
     logger.info(
-        f"username: {update.message.from_user.username} "
-        f"- issued command: {update.message.text}"
+        "username: %s - issued command: %s",
+        update.message.from_user.username,
+        update.message.text,
     )
     user_id = update.message.from_user.id
-    lastfm_service = context.bot_data["view_service"].lastfm_service
+    lastfm_service = context.view_service.lastfm_service
 
     # Get recent tracks
-    recent_tracks = lastfm_service.get_recent_tracks(user_id)
+    _, recent_tracks = await lastfm_service.get_recent_tracks(user_id)
     if not recent_tracks:
         await update.message.reply_text(
             "Couldn't find your recent tracks. Make sure your Last.fm is set up with /set"
@@ -443,25 +522,26 @@ async def vibe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     current = track_list[0] if track_list else None
 
     # Generate vibe
-    vibe_text = ai.generate_vibe(track_list, current)
+    vibe_text = await ai.generate_vibe(track_list, current)
     await update.message.reply_text(f"🎧 *Your Vibe*\n\n{vibe_text}", parse_mode="Markdown")
 
 
 @log_command(ROAST_COMMAND)
-async def roast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def roast(update: Update, context: BotContext) -> None:
     """Generates a humorous AI roast of the user's music taste."""
     logger.info(
-        f"username: {update.message.from_user.username} "
-        f"- issued command: {update.message.text}"
+        "username: %s - issued command: %s",
+        update.message.from_user.username,
+        update.message.text,
     )
     user_id = update.message.from_user.id
-    lastfm_service = context.bot_data["view_service"].lastfm_service
+    lastfm_service = context.view_service.lastfm_service
 
     # Get top artists and tracks
-    top_artists = lastfm_service.get_tops(
+    top_artists = await lastfm_service.get_tops(
         user_id, lastfm.EntityType.ARTIST, lastfm.Period.OVERALL
     )
-    top_tracks = lastfm_service.get_tops(
+    top_tracks = await lastfm_service.get_tops(
         user_id, lastfm.EntityType.TRACK, lastfm.Period.OVERALL
     )
 
@@ -478,22 +558,23 @@ async def roast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     tracks_list = [f"{item.item.artist} - {item.item.title}" for item in (top_tracks or [])[:5]]
 
     # Generate roast
-    roast_text = ai.generate_roast(artists_list, tracks_list)
+    roast_text = await ai.generate_roast(artists_list, tracks_list)
     await update.message.reply_text(f"🎤 *Music Taste Roast*\n\n{roast_text}", parse_mode="Markdown")
 
 
 @log_command(RECOMMEND_COMMAND)
-async def recommend(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def recommend(update: Update, context: BotContext) -> None:
     """Generates AI-powered music recommendations."""
     logger.info(
-        f"username: {update.message.from_user.username} "
-        f"- issued command: {update.message.text}"
+        "username: %s - issued command: %s",
+        update.message.from_user.username,
+        update.message.text,
     )
     user_id = update.message.from_user.id
-    lastfm_service = context.bot_data["view_service"].lastfm_service
+    lastfm_service = context.view_service.lastfm_service
 
     # Get top artists
-    top_artists = lastfm_service.get_tops(
+    top_artists = await lastfm_service.get_tops(
         user_id, lastfm.EntityType.ARTIST, lastfm.Period.OVERALL
     )
 
@@ -509,7 +590,7 @@ async def recommend(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     artists_list = [item.item.name for item in top_artists[:10]]
 
     # Generate recommendations
-    rec_text = ai.generate_recommendations(artists_list)
+    rec_text = await ai.generate_recommendations(artists_list)
     await update.message.reply_text(
         f"💡 *Recommendations Based On Your Taste*\n\n{rec_text}",
         parse_mode="Markdown",
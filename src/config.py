@@ -10,15 +10,13 @@ PROJECT_ROOT = Path(__file__).parent.parent
 CHANGELOG_PATH = PROJECT_ROOT / "CHANGELOG.md"
 
 ## DB
-_db_path = os.getenv("DB_SQLITE_NAME", "data/lastfmbucket-bot.db")
+_db_path = Path(os.getenv("DB_SQLITE_NAME", "data/lastfmbucket-bot.db"))
 # Make relative paths relative to project root, not current directory
-if not os.path.isabs(_db_path):
-    DB_SQLITE_NAME = str(PROJECT_ROOT / _db_path)
-else:
-    DB_SQLITE_NAME = _db_path
+DB_SQLITE_PATH = _db_path if _db_path.is_absolute() else PROJECT_ROOT / _db_path
+DB_SQLITE_NAME = str(DB_SQLITE_PATH)
 
 # Ensure the database directory exists
-Path(DB_SQLITE_NAME).parent.mkdir(parents=True, exist_ok=True)
+DB_SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 ## Last.fm
 LASTFM_API_KEY = os.getenv("LASTFM_API_KEY")
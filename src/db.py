@@ -1,9 +1,15 @@
+import asyncio
+import functools
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
 
-from peewee import BigIntegerField, CharField, ForeignKeyField, Model
-from playhouse.sqlite_ext import SqliteExtDatabase
+from peewee import BigIntegerField, CharField, ForeignKeyField, Model, chunked, fn
+from playhouse.sqlite_ext import FTS5Model, SearchField, SqliteExtDatabase
 
 import config
+from cache import TTLCache
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
@@ -25,6 +31,10 @@ db = SqliteExtDatabase(
     },
 )
 
+# All writes from the bot go through this single thread: SQLite sees them
+# serialized and the event loop never waits on a write lock
+WRITE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
 """
 Models
 """
@@ -50,31 +60,127 @@ class Chat(Model):
 
 class CommandLog(Model):
     user_id = BigIntegerField()
-    username = CharField(default="")
-    command = CharField()
+    username = CharField(default="", index=True)
+    command = CharField(index=True)
     args = CharField(default="")
     chat = ForeignKeyField(Chat, backref="command_logs", null=True)
-    timestamp = BigIntegerField()  # Unix timestamp
+    timestamp = BigIntegerField(index=True)  # Unix timestamp
 
     class Meta:
         database = db
+        indexes = (
+            # Per-user and per-chat history, newest first
+            (("user_id", "timestamp"), False),
+            (("chat", "timestamp"), False),
+        )
+
+
+class CommandLogIndex(FTS5Model):
+    """
+    Full-text index over CommandLog, kept in sync by triggers.
 
+    The trigram tokenizer lets substring filters (LIKE '%x%') use the index
+    instead of scanning the whole log table.
+    """
+
+    command = SearchField()
+    username = SearchField()
+    args = SearchField()
+
+    class Meta:
+        database = db
+        options = {"content": CommandLog, "tokenize": "trigram"}
 
-MODELS = [User, Chat, CommandLog]
+
+MODELS = [User, Chat, CommandLog, CommandLogIndex]
+
+COMMAND_LOG_INDEX_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS commandlog_ai AFTER INSERT ON commandlog BEGIN
+        INSERT INTO commandlogindex (rowid, command, username, args)
+        VALUES (new.id, new.command, new.username, new.args);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS commandlog_ad AFTER DELETE ON commandlog BEGIN
+        INSERT INTO commandlogindex (commandlogindex, rowid, command, username, args)
+        VALUES ('delete', old.id, old.command, old.username, old.args);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS commandlog_au AFTER UPDATE ON commandlog BEGIN
+        INSERT INTO commandlogindex (commandlogindex, rowid, command, username, args)
+        VALUES ('delete', old.id, old.command, old.username, old.args);
+        INSERT INTO commandlogindex (rowid, command, username, args)
+        VALUES (new.id, new.command, new.username, new.args);
+    END
+    """,
+]
 
 """
 DB Connection
 """
 db.connect()
+_command_log_index_exists = CommandLogIndex.table_exists()
 db.create_tables(MODELS, safe=True)
+for trigger_sql in COMMAND_LOG_INDEX_TRIGGERS:
+    db.execute_sql(trigger_sql)
+if not _command_log_index_exists:
+    # Index rows logged before the full-text table existed
+    CommandLogIndex.rebuild()
+
+# Updates used to store the Telegram username as a tuple repr, e.g. "('name',)"
+User.update(
+    telegram_username=fn.substr(
+        User.telegram_username, 3, fn.length(User.telegram_username) - 5
+    )
+).where(
+    User.telegram_username.startswith("('") & User.telegram_username.endswith("',)")
+).execute()
+User.update(telegram_username="").where(User.telegram_username == "(None,)").execute()
 
 """
 DB Methods
 """
 
 
+async def write(func: Callable, *args, **kwargs) -> Any:
+    """Runs a DB write function on the writer thread and returns its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        WRITE_EXECUTOR, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def read(func: Callable, *args, **kwargs) -> Any:
+    """Runs a DB read function in a worker thread and returns its result."""
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+# Chats seen recently, so logging a command doesn't rewrite an unchanged chat
+_chat_cache = TTLCache(maxsize=10000, ttl=600)
+# Users read recently; every command looks one up. Kept short because the admin
+# process can delete users without touching this process's cache.
+_user_cache = TTLCache(maxsize=10000, ttl=60)
+# Bumped by every user write once it has committed; a read that started before
+# a write must not put the row it saw back into the cache
+_user_cache_version = 0
+_user_cache_lock = threading.Lock()
+
+
+def _refresh_cached_user(telegram_user_id: int, user: User | None) -> None:
+    """Replaces the cached user after a committed write, discarding racing reads."""
+    global _user_cache_version
+    with _user_cache_lock:
+        _user_cache_version += 1
+        if user is None:
+            _user_cache.pop(telegram_user_id)
+        else:
+            _user_cache.set(telegram_user_id, user)
+
+
 def create_or_update_user(
-    telegram_user_id: int, telegram_username: str, lastfm_username: str | None
+    telegram_user_id: int, telegram_username: str | None, lastfm_username: str | None
 ) -> User:
     """
     Creates or updates a user in the database based on the given parameters. If the
@@ -83,27 +189,28 @@ def create_or_update_user(
     information is updated with the provided telegram_username and lastfm_username.
 
     :param telegram_user_id: The unique identifier for the user in Telegram.
-    :param telegram_username: The username of the user in Telegram.
+    :param telegram_username: The username of the user in Telegram. This parameter
+        can be None, for accounts without one.
     :param lastfm_username: The username of the user in Last.fm. This parameter
         can be None.
     :return: The User object that was created or updated.
     """
-    with db.atomic():
-        user, created = User.get_or_create(
+    user = (
+        User.insert(
             telegram_id=telegram_user_id,
-            defaults={
-                "telegram_username": telegram_username,
-                "lastfm_username": lastfm_username,
-            },
+            # The NOT NULL check runs before the conflict is resolved
+            telegram_username=telegram_username or "",
+            lastfm_username=lastfm_username,
         )
-
-        if not created:
-            user.telegram_username = (telegram_username,)
-            user.lastfm_username = lastfm_username
-            user.save()
-            logging.info(f"User updated: {user}")
-        else:
-            logging.info(f"User created: {user}")
+        .on_conflict(
+            conflict_target=[User.telegram_id],
+            preserve=[User.telegram_username, User.lastfm_username],
+        )
+        .returning(User)
+        .execute()[0]
+    )
+    logging.info(f"User saved: {user}")
+    _refresh_cached_user(telegram_user_id, user)
     return user
 
 
@@ -122,7 +229,15 @@ def get_user(telegram_user_id: int) -> User | None:
     :return: The user object associated with the given Telegram ID.
     :rtype: User
     """
-    return User.get_or_none(telegram_id=telegram_user_id)
+    user = _user_cache.get(telegram_user_id)
+    if user is None:
+        version = _user_cache_version
+        user = User.select().where(User.telegram_id == telegram_user_id).first()
+        if user is not None:
+            with _user_cache_lock:
+                if version == _user_cache_version:
+                    _user_cache.set(telegram_user_id, user)
+    return user
 
 
 def delete_user(telegram_user_id: int) -> None:
@@ -138,46 +253,53 @@ def delete_user(telegram_user_id: int) -> None:
         if user:
             user.delete_instance()
             logging.info(f"User with telegram_id {telegram_user_id} deleted.")
+    _refresh_cached_user(telegram_user_id, None)
 
 
-def log_command(
-    user_id: int,
-    username: str,
-    command: str,
-    args: str,
-    chat_id: int,
-    chat_type: str,
-    chat_name: str = "",
-) -> CommandLog:
-    """Logs a command execution to the database."""
-    import time
+def log_commands(entries: list[dict]) -> None:
+    """
+    Logs a batch of command executions to the database in one transaction.
 
-    with db.atomic():
-        chat = get_or_create_chat(chat_id, chat_name, chat_type)
-        log_entry = CommandLog.create(
-            user_id=user_id,
-            username=username,
-            command=command,
-            args=args,
-            chat=chat,
-            timestamp=int(time.time()),
-        )
-    return log_entry
+    Each entry holds the CommandLog fields plus ``chat_id``, ``chat_type`` and
+    ``chat_name``, which are resolved to the corresponding Chat row.
+    """
+    try:
+        with db.atomic():
+            rows = []
+            for entry in entries:
+                entry = dict(entry)
+                chat = get_or_create_chat(
+                    entry.pop("chat_id"), entry.pop("chat_name"), entry.pop("chat_type")
+                )
+                rows.append({**entry, "chat": chat})
+            for batch in chunked(rows, 100):
+                CommandLog.insert_many(batch).execute()
+    except Exception:
+        # Chats created in the rolled back transaction may be cached
+        _chat_cache.clear()
+        raise
 
 
 def get_or_create_chat(
     telegram_chat_id: int, chat_name: str = "", chat_type: str = ""
 ) -> Chat:
     """Gets or creates a chat entry in the database."""
-    with db.atomic():
-        chat, created = Chat.get_or_create(
-            telegram_id=telegram_chat_id,
-            defaults={"telegram_chat_name": chat_name, "chat_type": chat_type},
+    cached = _chat_cache.get(telegram_chat_id)
+    if cached and cached.telegram_chat_name == chat_name and cached.chat_type == chat_type:
+        return cached
+
+    chat = (
+        Chat.insert(
+            telegram_id=telegram_chat_id, telegram_chat_name=chat_name, chat_type=chat_type
+        )
+        .on_conflict(
+            conflict_target=[Chat.telegram_id],
+            preserve=[Chat.telegram_chat_name, Chat.chat_type],
         )
-        if not created and (chat.telegram_chat_name != chat_name or chat.chat_type != chat_type):
-            chat.telegram_chat_name = chat_name
-            chat.chat_type = chat_type
-            chat.save()
+        .returning(Chat)
+        .execute()[0]
+    )
+    _chat_cache.set(telegram_chat_id, chat)
     return chat
 
 
@@ -186,7 +308,7 @@ def create_or_update_chat(telegram_chat_id: int, telegram_chat_name: str) -> Cha
     Creates or updates a chat entry in the database. If a chat with the given
     telegram_chat_id exists, its name will be updated to the provided
     telegram_chat_name. Otherwise, a new chat record is created using the given
-    details. Log messages are recorded for both creation and update events.
+    details. A log message is recorded either way.
 
     :param telegram_chat_id: Unique identifier for the chat in Telegram.
     :type telegram_chat_id: int
@@ -195,15 +317,14 @@ def create_or_update_chat(telegram_chat_id: int, telegram_chat_name: str) -> Cha
     :return: The corresponding Chat object after creation or update.
     :rtype: Chat
     """
-    with db.atomic():
-        chat, created = Chat.get_or_create(
-            telegram_id=telegram_chat_id,
-            defaults={"telegram_chat_name": telegram_chat_name},
+    chat = (
+        Chat.insert(telegram_id=telegram_chat_id, telegram_chat_name=telegram_chat_name)
+        .on_conflict(
+            conflict_target=[Chat.telegram_id], preserve=[Chat.telegram_chat_name]
         )
-        if not created:
-            chat.telegram_chat_name = telegram_chat_name
-            chat.save()
-            logging.info(f"Chat updated: {chat}")
-        else:
-            logging.info(f"Chat created: {chat}")
+        .returning(Chat)
+        .execute()[0]
+    )
+    logging.info(f"Chat saved: {chat}")
+    _chat_cache.pop(telegram_chat_id)
     return chat
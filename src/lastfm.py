@@ -1,16 +1,37 @@
+import asyncio
+import functools
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from enum import StrEnum
+from typing import Any, Callable, Hashable
 
+import httpx
 import pylast
 from pylast import LastFMNetwork, PlayedTrack, Track, User
 
 import config
+from cache import TTLCache
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
 )
 logger = logging.getLogger(__name__)
 
+# Seconds each kind of Last.fm response is reused for the same arguments
+NOW_PLAYING_TTL = 20
+STATS_TTL = 300
+TOPS_TTL = 600
+CACHE_MAXSIZE = 1024
+
+# Bounds concurrent Last.fm requests, which share one API key and its rate limit
+LASTFM_MAX_WORKERS = 8
+LASTFM_EXECUTOR = ThreadPoolExecutor(
+    max_workers=LASTFM_MAX_WORKERS, thread_name_prefix="lastfm"
+)
+
+# Lets a cached None (e.g. nothing playing) be told apart from a cache miss
+_MISSING = object()
+
 
 class Period(StrEnum):
     OVERALL = pylast.PERIOD_OVERALL
@@ -21,46 +42,190 @@ class Period(StrEnum):
     YEAR = pylast.PERIOD_12MONTHS
 
 
+# Longer periods barely move between requests, so their tops are kept longer
+TOPS_TTLS = {
+    Period.WEEK: 300,
+    Period.ONE_MONTH: 3600,
+    Period.THREE_MONTHS: 3600,
+    Period.SIX_MONTHS: 86400,
+    Period.YEAR: 86400,
+    Period.OVERALL: 86400,
+}
+
+
 class EntityType(StrEnum):
     ARTIST = "artist"
     ALBUM = "album"
     TRACK = "track"
 
 
+async def run(func: Callable, *args, **kwargs) -> Any:
+    """Runs a blocking pylast call on the Last.fm thread pool and returns its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        LASTFM_EXECUTOR, functools.partial(func, *args, **kwargs)
+    )
+
+
+# Last.fm calls currently running, by key, so concurrent duplicates can share them
+_inflight: dict[Hashable, asyncio.Future] = {}
+
+
+async def run_shared(key: Hashable, func: Callable, *args, **kwargs) -> Any:
+    """
+    Like ``run``, but concurrent calls with the same ``key`` share one request.
+
+    The shared call is shielded, so a caller being cancelled does not cancel it
+    for the others.
+    """
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(run(func, *args, **kwargs))
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(future)
+
+
+# Keep-alive connections shared by all Last.fm requests
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """
+    HTTPS transport whose connections outlive pylast's per-request client.
+
+    pylast opens and closes an httpx.Client for every API call. Mounted
+    through ``enable_proxy``, this transport lets those calls share one
+    keep-alive pool instead of paying a TCP and TLS handshake each time.
+    """
+
+    def close(self) -> None:
+        pass  # Closing pylast's throwaway client must not drop the shared pool
+
+    def shutdown(self) -> None:
+        """Closes the pooled connections for good."""
+        super().close()
+
+
+# pylast User method that fetches the top items of each entity type
+TOP_FETCHERS = {
+    EntityType.ARTIST: "get_top_artists",
+    EntityType.ALBUM: "get_top_albums",
+    EntityType.TRACK: "get_top_tracks",
+}
+
+
 class LastfmClient:
+    STATS_LIMIT = 5
+    # Top artists fetched per user for /compare, also used for common artists
+    COMMON_ARTISTS_POOL = 50
+
     def __init__(self):
         self.client = LastFMNetwork(
             api_key=config.LASTFM_API_KEY, api_secret=config.LASTFM_API_SECRET
         )
+        self._transport = PooledTransport(
+            verify=pylast.SSL_CONTEXT, limits=HTTP_POOL_LIMITS, retries=2
+        )
+        self.client.enable_proxy({"https://": self._transport})
+        # pylast User objects only wrap the name, so one per username is enough
+        self._user = functools.lru_cache(maxsize=CACHE_MAXSIZE)(self.client.get_user)
+        # Keys start with the Last.fm username so forget_user() can find them
+        self._now_playing_cache = TTLCache(CACHE_MAXSIZE, NOW_PLAYING_TTL)
+        self._recent_tracks_cache = TTLCache(CACHE_MAXSIZE, NOW_PLAYING_TTL)
+        self._stats_cache = TTLCache(CACHE_MAXSIZE, STATS_TTL)
+        self._tops_cache = TTLCache(CACHE_MAXSIZE, TOPS_TTL)
+
+    def close(self) -> None:
+        """Closes this client's connection pool."""
+        # LASTFM_EXECUTOR is module-wide, so it's left for other clients and run()
+        self._transport.shutdown()
 
     def get_user(self, username: str) -> User | None:
-        user = self.client.get_user(username)
+        user = self._user(username)
         return user
 
     def get_now_playing(self, username: str) -> Track | None:
-        now_playing = self.client.get_user(username).get_now_playing()
+        key = (username,)
+        now_playing = self._now_playing_cache.get(key, _MISSING)
+        if now_playing is _MISSING:
+            now_playing = self._user(username).get_now_playing()
+            self._now_playing_cache.set(key, now_playing)
         return now_playing
 
     def get_recent_tracks(self, username: str, limit=int) -> list[PlayedTrack]:
-        recent_tracks = self.client.get_user(username).get_recent_tracks(
-            now_playing=True, limit=limit
-        )
+        key = (username, limit)
+        recent_tracks = self._recent_tracks_cache.get(key)
+        if recent_tracks is None:
+            recent_tracks = self._user(username).get_recent_tracks(
+                now_playing=True, limit=limit
+            )
+            self._recent_tracks_cache.set(key, recent_tracks)
         return recent_tracks
 
-    def get_user_stats(self, username: str) -> dict | None:
-        """Get comprehensive stats for a user."""
+    def get_tops(
+        self, username: str, entity_type: EntityType, period: Period, limit: int
+    ) -> list[pylast.TopItem] | None:
+        key = (username, entity_type, period, limit)
+        tops = self._tops_cache.get(key)
+        if tops is not None:
+            return tops
+
+        fetcher = TOP_FETCHERS.get(entity_type)
+        if not fetcher:
+            return None
+        tops = getattr(self._user(username), fetcher)(
+            period=period, limit=limit
+        )
+        self._tops_cache.set(key, tops, ttl=TOPS_TTLS.get(period, TOPS_TTL))
+        return tops
+
+    def forget_user(self, username: str) -> None:
+        """Drops every cached response for ``username``."""
+        for cache in (
+            self._now_playing_cache,
+            self._recent_tracks_cache,
+            self._stats_cache,
+            self._tops_cache,
+        ):
+            cache.discard_where(lambda key: key[0] == username)
+
+    async def get_user_stats(self, username: str) -> dict | None:
+        """
+        Get comprehensive stats for a user.
+
+        ``top_artists`` holds up to ``COMMON_ARTISTS_POOL`` artists so the
+        same list can feed ``get_common_artists``; display code slices it.
+        """
+        key = (username,)
+        stats = self._stats_cache.get(key)
+        if stats is not None:
+            return stats
+
         try:
-            user = self.client.get_user(username)
-            playcount = user.get_playcount()
-            top_artists = user.get_top_artists(period=Period.OVERALL, limit=5)
-            top_albums = user.get_top_albums(period=Period.OVERALL, limit=5)
-            top_tracks = user.get_top_tracks(period=Period.OVERALL, limit=5)
+            user = self._user(username)
+            # Independent Last.fm requests, so fetch them in parallel
+            playcount, top_artists, top_albums, top_tracks = await asyncio.gather(
+                run(user.get_playcount),
+                run(
+                    user.get_top_artists,
+                    period=Period.OVERALL,
+                    limit=self.COMMON_ARTISTS_POOL,
+                ),
+                run(user.get_top_albums, period=Period.OVERALL, limit=self.STATS_LIMIT),
+                run(user.get_top_tracks, period=Period.OVERALL, limit=self.STATS_LIMIT),
+            )
 
-            return {
+            stats = {
                 "username": username,
                 "playcount": playcount,
+                "playcount_fmt": f"{playcount:,}",
                 "top_artists": [
-                    {"name": item.item.name, "plays": int(item.weight)}
+                    {
+                        "name": item.item.name,
+                        "plays": int(item.weight),
+                        "plays_fmt": f"{int(item.weight):,}",
+                    }
                     for item in top_artists
                 ],
                 "top_albums": [f"{item.item.artist} - {item.item.title}" for item in top_albums],
@@ -69,34 +234,28 @@ class LastfmClient:
         except Exception as e:
             logger.error(f"Error getting stats for {username}: {e}")
             return None
+        self._stats_cache.set(key, stats)
+        return stats
 
+    @staticmethod
     def get_common_artists(
-        self, username1: str, username2: str, limit: int = 50
+        top_artists1: list[dict], top_artists2: list[dict]
     ) -> list[dict]:
-        """Find common artists between two users based on their top artists."""
-        try:
-            user1_artists = {
-                item.item.name.lower(): {"name": item.item.name, "plays": int(item.weight)}
-                for item in self.client.get_user(username1).get_top_artists(
-                    period=Period.OVERALL, limit=limit
-                )
-            }
-            user2_artists = {
-                item.item.name.lower(): int(item.weight)
-                for item in self.client.get_user(username2).get_top_artists(
-                    period=Period.OVERALL, limit=limit
-                )
+        """Find common artists between two users' ``get_user_stats`` top artists."""
+        user1_artists = {artist["name"].lower(): artist for artist in top_artists1}
+        user2_artists = {artist["name"].lower(): artist for artist in top_artists2}
+        common_names = sorted(
+            user1_artists.keys() & user2_artists.keys(),
+            key=lambda name: user1_artists[name]["plays"],
+            reverse=True,
+        )
+        return [
+            {
+                "name": user1_artists[name]["name"],
+                "plays1": user1_artists[name]["plays"],
+                "plays2": user2_artists[name]["plays"],
+                "plays1_fmt": user1_artists[name]["plays_fmt"],
+                "plays2_fmt": user2_artists[name]["plays_fmt"],
             }
-            common = [
-                {
-                    "name": user1_artists[name]["name"],
-                    "plays1": user1_artists[name]["plays"],
-                    "plays2": user2_artists[name],
-                }
-                for name in user1_artists
-                if name in user2_artists
-            ]
-            return common[:10]  # Return top 10 common artists
-        except Exception as e:
-            logger.error(f"Error getting common artists: {e}")
-            return []
+            for name in common_names[:10]  # Return top 10 common artists
+        ]
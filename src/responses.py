@@ -1,58 +1,63 @@
 from string import Template
 
-start_response = Template("""
+from emoji import emojize
+
+# Templates are emojized once here, so any :shortcode: in the static text is
+# already converted and rendered responses can be sent as-is.
+
+start_response = Template(emojize("""
 Hi @$username, welcome to LastfmBucket Bot! $setup_lastfm_user
 
 The code of this bot is public: https://github.com/paurieraf/lastfmbucket-bot 
 
 Use /privacy for any privacy-related questions
-""")
+"""))
 
-lastfm_username_set = Template("""
+lastfm_username_set = Template(emojize("""
 ✅ Last.fm username @$lastfm_username set
-""")
+"""))
 
-lastfm_username_set_user_not_found = Template("""
+lastfm_username_set_user_not_found = Template(emojize("""
 🚫 No Last.fm user has been found with this username: @$lastfm_username
-""")
+"""))
 
-user_not_found = Template("""
+user_not_found = Template(emojize("""
 🔎 No Last.fm set for your user. Use /set [username] to set your Last.fm username
-""")
+"""))
 
-now_playing = Template("""
+now_playing = Template(emojize("""
 @$lastfm_username is currently playing:
 🎧 <i>$track_artist</i>  — <strong><a href='$track_url'>$track_title</a></strong>, [$track_album]
-""")
+"""))
 
-now_playing_no_currently_playing = Template("""
+now_playing_no_currently_playing = Template(emojize("""
 <strong>$lastfm_username</strong> is not currently playing music
-""")
+"""))
 
-recent_tracks = Template("""
+recent_tracks = Template(emojize("""
 $telegram_user_first_name is now listening to
 $recent_tracks_list
-""")
+"""))
 
-tops_choose_entity_type = Template("""
+tops_choose_entity_type = Template(emojize("""
 Choose the type of top you want to see:
-""")
+"""))
 
-tops_choose_period = Template("""
+tops_choose_period = Template(emojize("""
 Choose the period for $entity_type:
-""")
+"""))
 
-tops_list = Template("""
+tops_list = Template(emojize("""
 Top $entity_type for $period for <a href="https://www.last.fm/user/$lastfm_username">$lastfm_username</a>:
 
 $tops_list
-""")
+"""))
 
-tops_no_available_response = Template("""
+tops_no_available_response = Template(emojize("""
 There are no tops available for this user: $lastfm_username
-""")
+"""))
 
-privacy = Template("""\
+privacy = Template(emojize("""\
 <b>Privacy Policy</b>
 This bot is a hobby project and is not a commercial product.
 
@@ -73,17 +78,17 @@ This bot is a hobby project and is not a commercial product.
 - This bot is licensed under the GPLv3. The source code is available on <a href="https://github.com/paurieraf/lastfmbucket-bot">GitHub</a>.
 
 For any questions or concerns, please contact the developer.
-""")
+"""))
 
-preferences= Template("""
+preferences= Template(emojize("""
 What do you want to do?
-""")
+"""))
 
-preferences_unlink_account = Template("""
+preferences_unlink_account = Template(emojize("""
 Your account has been unlinked
-""")
+"""))
 
-compare_stats = Template("""
+compare_stats = Template(emojize("""
 <b>📊 Comparison: $user1 vs $user2</b>
 
 <b>Total Scrobbles</b>
@@ -96,12 +101,12 @@ $common_artists
 <b>Top Artists</b>
 <u>$user1</u>: $top_artists1
 <u>$user2</u>: $top_artists2
-""")
+"""))
 
-compare_user_not_found = Template("""
+compare_user_not_found = Template(emojize("""
 🔎 Last.fm user not found: $username
-""")
+"""))
 
-compare_no_lastfm_set = Template("""
+compare_no_lastfm_set = Template(emojize("""
 🔎 You need to set your Last.fm username first. Use /set [username]
-""")
+"""))
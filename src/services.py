@@ -2,28 +2,155 @@
 This module defines the service layer for handling business logic and view rendering.
 """
 
-import datetime
+import asyncio
+import functools
 import logging
+import time
 from typing import Optional
 
 import humanize
 import pylast
 import telegram
-from emoji import emojize
 from telegram import InlineKeyboardButton
 
 import config
 import db
 import lastfm
 import responses
-from callbacks import Action, Callback, Entity, Period as CallbackPeriod, entity_from_lastfm, period_from_lastfm
+from callbacks import Action, Callback, Entity, entity_from_lastfm, period_from_lastfm
 from lastfm import EntityType, LastfmClient, Period
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
+CHANGELOG_MAX_LENGTH = 4000
+
+
+def _load_changelog() -> str:
+    """Reads CHANGELOG.md into the /changelog reply, truncated to fit a message."""
+    try:
+        changelog_content = config.CHANGELOG_PATH.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return "Changelog not available."
+    if len(changelog_content) > CHANGELOG_MAX_LENGTH:
+        changelog_content = (
+            changelog_content[:CHANGELOG_MAX_LENGTH] + "\n\n... (truncated)"
+        )
+    return f"<pre>{changelog_content}</pre>"
+
+
+# The changelog only changes on deploy, so it is read once per process
+CHANGELOG_RESPONSE = _load_changelog()
+
+# User-friendly period names, also the /tops period buttons in keyboard order
+PERIOD_DISPLAY_NAMES = {
+    lastfm.Period.WEEK: "1week",
+    lastfm.Period.ONE_MONTH: "1month",
+    lastfm.Period.THREE_MONTHS: "3month",
+    lastfm.Period.SIX_MONTHS: "6month",
+    lastfm.Period.YEAR: "1year",
+    lastfm.Period.OVERALL: "alltime",
+}
+TOPS_PERIOD_ROW_SIZE = 3
+
+# Labels of the /tops entity-type buttons, in keyboard order
+TOPS_ENTITY_BUTTONS = (
+    ("👤 Artist", Entity.ARTIST),
+    ("💿 Album", Entity.ALBUM),
+    ("🎵 Track", Entity.TRACK),
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def tops_entity_keyboard(telegram_user_id: int) -> telegram.InlineKeyboardMarkup:
+    """Builds the /tops entity-type keyboard, reused per user since it never changes."""
+    return telegram.InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(
+                    label,
+                    callback_data=Callback(
+                        Action.TOPS, telegram_user_id, entity=entity
+                    ).encode(),
+                )
+                for label, entity in TOPS_ENTITY_BUTTONS
+            ]
+        ]
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def tops_period_keyboard(
+    telegram_user_id: int, cb_entity: Entity
+) -> telegram.InlineKeyboardMarkup:
+    """Builds the /tops period keyboard for one user and entity type."""
+    buttons = [
+        InlineKeyboardButton(
+            name,
+            callback_data=Callback(
+                Action.TOPS,
+                telegram_user_id,
+                entity=cb_entity,
+                period=period_from_lastfm(period),
+            ).encode(),
+        )
+        for period, name in PERIOD_DISPLAY_NAMES.items()
+    ]
+    return telegram.InlineKeyboardMarkup(
+        [
+            buttons[i : i + TOPS_PERIOD_ROW_SIZE]
+            for i in range(0, len(buttons), TOPS_PERIOD_ROW_SIZE)
+        ]
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def np_keyboard(telegram_user_id: int, show_cover: bool) -> telegram.InlineKeyboardMarkup:
+    """Builds the /np keyboard, with a cover button unless the cover is shown."""
+    row = [
+        telegram.InlineKeyboardButton(
+            "More info",
+            callback_data=Callback(Action.NP_MORE, telegram_user_id).encode(),
+        )
+    ]
+    if not show_cover:
+        row.insert(
+            0,
+            telegram.InlineKeyboardButton(
+                "🖼️",
+                callback_data=Callback(Action.NP_LESS_COVER, telegram_user_id).encode(),
+            ),
+        )
+    return telegram.InlineKeyboardMarkup([row])
+
+
+def naturaldelta(seconds: float) -> str:
+    """
+    Same wording as ``humanize.naturaldelta``, with a fast path for deltas under
+    a day, which covers nearly every recent track.
+    """
+    if not 0 <= seconds < 86400:
+        return humanize.naturaldelta(seconds)
+    seconds = int(seconds)
+    if seconds < 1:
+        return "a moment"
+    if seconds == 1:
+        return "a second"
+    if seconds < 60:
+        return f"{seconds} seconds"
+    if seconds < 3600:
+        minutes = round(seconds / 60)
+        if minutes == 1:
+            return "a minute"
+        if minutes == 60:
+            return "an hour"
+        return f"{minutes} minutes"
+    hours = round(seconds / 3600)
+    if hours == 1:
+        return "an hour"
+    if hours == 24:
+        return "a day"
+    return f"{hours} hours"
+
 
 class LastfmService:
     """
@@ -37,75 +164,78 @@ class LastfmService:
     def __init__(self, lastfm_client: LastfmClient):
         self._lastfm_client = lastfm_client
 
-    def set_lastfm_username(
-        self, telegram_user_id: int, telegram_username: str, lastfm_username: str
+    async def set_lastfm_username(
+        self, telegram_user_id: int, telegram_username: str | None, lastfm_username: str
     ) -> tuple[db.User | None, bool]:
         lastfm_user = self._lastfm_client.get_user(lastfm_username)
         if not lastfm_user:
             return None, False
 
-        user = db.create_or_update_user(
+        user = await db.write(
+            db.create_or_update_user,
             telegram_user_id=telegram_user_id,
             telegram_username=telegram_username,
             lastfm_username=lastfm_username,
         )
         return user, True
 
-    def get_now_playing(
+    async def get_now_playing(
         self, telegram_user_id: int
     ) -> tuple[db.User | None, pylast.Track | None]:
-        user = db.get_user(telegram_user_id)
+        user = await db.read(db.get_user, telegram_user_id)
         if not user:
             return None, None
 
-        now_playing_track = self._lastfm_client.get_now_playing(user.lastfm_username)
+        now_playing_track = await lastfm.run_shared(
+            ("now_playing", user.lastfm_username),
+            self._lastfm_client.get_now_playing,
+            user.lastfm_username,
+        )
         return user, now_playing_track
 
-    def get_recent_tracks(
+    async def get_recent_tracks(
         self, telegram_user_id: int
-    ) -> list[pylast.PlayedTrack] | None:
-        user = db.get_user(telegram_user_id)
+    ) -> tuple[db.User | None, list[pylast.PlayedTrack] | None]:
+        user = await db.read(db.get_user, telegram_user_id)
         if not user:
-            return None
+            return None, None
 
-        recent_tracks = self._lastfm_client.get_recent_tracks(
-            user.lastfm_username, limit=self.STATUS_LIMIT
+        recent_tracks = await lastfm.run_shared(
+            ("recent_tracks", user.lastfm_username, self.STATUS_LIMIT),
+            self._lastfm_client.get_recent_tracks,
+            user.lastfm_username,
+            limit=self.STATUS_LIMIT,
         )
-        return recent_tracks
+        return user, recent_tracks
 
-    def get_tops(
+    async def get_tops(
         self,
         telegram_user_id: int,
         entity_type: EntityType,
         period: Period,
         extended_limit: bool = False,
     ) -> list[pylast.TopItem] | None:
-        user = db.get_user(telegram_user_id)
+        user = await db.read(db.get_user, telegram_user_id)
         if not user:
             return None
 
         limit = (
             self.TOPS_DEFAULT_LIMIT if not extended_limit else self.TOPS_EXTENDED_LIMIT
         )
-        if entity_type == EntityType.ARTIST:
-            tops = self._lastfm_client.client.get_user(
-                user.lastfm_username
-            ).get_top_artists(period=period, limit=limit)
-        elif entity_type == EntityType.ALBUM:
-            tops = self._lastfm_client.client.get_user(
-                user.lastfm_username
-            ).get_top_albums(period=period, limit=limit)
-        elif entity_type == EntityType.TRACK:
-            tops = self._lastfm_client.client.get_user(
-                user.lastfm_username
-            ).get_top_tracks(period=period, limit=limit)
-        else:
-            tops = None
-        return tops
+        return await lastfm.run_shared(
+            ("tops", user.lastfm_username, entity_type, period, limit),
+            self._lastfm_client.get_tops,
+            user.lastfm_username,
+            entity_type,
+            period,
+            limit,
+        )
 
-    @staticmethod
-    def unlink_user(telegram_user_id: int):
-        db.delete_user(telegram_user_id)
+    async def unlink_user(self, telegram_user_id: int):
+        user = await db.read(db.get_user, telegram_user_id)
+        await db.write(db.delete_user, telegram_user_id)
+        if user:
+            self._lastfm_client.forget_user(user.lastfm_username)
 
 
 class ViewService:
@@ -116,7 +246,7 @@ class ViewService:
 
     @staticmethod
     async def build_start_response(telegram_user: telegram.User) -> str:
-        user = db.get_user(telegram_user.id)
+        user = await db.read(db.get_user, telegram_user.id)
         if not user:
             setup_lastfm_user_text = "Use /set [username] to set your Last.fm username."
         else:
@@ -127,61 +257,47 @@ class ViewService:
         response = responses.start_response.substitute(
             username=telegram_user.username, setup_lastfm_user=setup_lastfm_user_text
         )
-        return emojize(response)
+        return response
 
     async def build_np_response(
         self, telegram_user_id: int, show_cover: bool = False
     ) -> tuple[str, telegram.InlineKeyboardMarkup | None, str | None]:
-        user, track = self.lastfm_service.get_now_playing(telegram_user_id)
+        user, track = await self.lastfm_service.get_now_playing(telegram_user_id)
         if not user:
-            logging.warning(
-                f"User with telegram_id {telegram_user_id} not found in the database"
+            logger.warning(
+                "User with telegram_id %s not found in the database", telegram_user_id
             )
             response = responses.user_not_found.substitute()
-            return emojize(response), None, None
+            return response, None, None
 
         if not track:
             response = responses.now_playing_no_currently_playing.substitute(
                 lastfm_username=user.lastfm_username
             )
-            return emojize(response), None, None
+            return response, None, None
+
+        # The getRecentTracks response behind get_now_playing already carries the
+        # album name and cover images; only ask Last.fm when the album is missing
+        album_title = track.info.get("album")
+        if album_title is None:
+            album = await lastfm.run(track.get_album)
+            album_title = album.title if album else ""
 
         response = responses.now_playing.substitute(
             lastfm_username=user.lastfm_username,
             track_artist=track.artist,
             track_url=track.get_url(),
             track_title=track.title,
-            track_album=track.get_album().title,
+            track_album=album_title,
         )
-        keyboard = [
-            [
-                telegram.InlineKeyboardButton(
-                    "More info",
-                    callback_data=Callback(Action.NP_MORE, telegram_user_id).encode(),
-                )
-            ]
-        ]
-        if not show_cover:
-            keyboard[0].insert(
-                0,
-                telegram.InlineKeyboardButton(
-                    "🖼️",
-                    callback_data=Callback(Action.NP_LESS_COVER, telegram_user_id).encode(),
-                ),
-            )
-
-        reply_markup = telegram.InlineKeyboardMarkup(keyboard)
+        reply_markup = np_keyboard(telegram_user_id, show_cover)
 
-        return (
-            emojize(response),
-            reply_markup,
-            track.get_album().get_cover_image() if show_cover else None,
-        )
+        return response, reply_markup, track.get_cover_image() if show_cover else None
 
     async def build_lastfm_username_set_response(
         self, telegram_user: telegram.User, lastfm_username: str
     ) -> str:
-        user, lastfm_user_exists = self.lastfm_service.set_lastfm_username(
+        user, lastfm_user_exists = await self.lastfm_service.set_lastfm_username(
             telegram_user_id=telegram_user.id,
             telegram_username=telegram_user.username,
             lastfm_username=lastfm_username,
@@ -191,35 +307,43 @@ class ViewService:
             response = responses.lastfm_username_set_user_not_found.substitute(
                 lastfm_username=lastfm_username
             )
-            return emojize(response)
+            return response
 
         response = responses.lastfm_username_set.substitute(
             lastfm_username=user.lastfm_username
         )
-        return emojize(response)
+        return response
 
     async def build_status_response(
         self, telegram_user_id: int, show_cover: bool = False
     ) -> tuple[str, telegram.InlineKeyboardMarkup | None, str | None]:
-        recent_tracks = self.lastfm_service.get_recent_tracks(telegram_user_id)
-        user = db.get_user(telegram_user_id)
+        user, recent_tracks = await self.lastfm_service.get_recent_tracks(
+            telegram_user_id
+        )
         if not recent_tracks or not user:
             response = responses.user_not_found.substitute()
-            return emojize(response), None, None
+            return response, None, None
 
-        recent_tracks_template_list = ""
+        # The album lookup is another Last.fm round-trip; overlap it with rendering
+        cover_task = (
+            asyncio.create_task(lastfm.run(self._get_cover_url, recent_tracks[0]))
+            if show_cover
+            else None
+        )
 
+        recent_tracks_lines = []
+        now = time.time()
         for played_track in recent_tracks:
             time_ago = ""
             is_currently_playing = True
             if played_track.timestamp:
                 is_currently_playing = False
                 time_ago = (
-                    f", {humanize.naturaldelta(datetime.datetime.now().timestamp() - float(played_track.timestamp))}"
+                    f", {naturaldelta(now - float(played_track.timestamp))}"
                     f" ago"
                 )
 
-            recent_tracks_template_list += (
+            recent_tracks_lines.append(
                 f"{'⏳' if is_currently_playing else ''} 🎧<i>{played_track.track.artist.name}</i>"
                 f" — <strong><a href='{played_track.track.get_url()}'>{played_track.track.title}</a></strong>,"
                 f" [{played_track.album}]"
@@ -228,7 +352,7 @@ class ViewService:
             )
         response = responses.recent_tracks.substitute(
             telegram_user_first_name=user.telegram_username or user.lastfm_username,
-            recent_tracks_list=recent_tracks_template_list,
+            recent_tracks_list="".join(recent_tracks_lines),
         )
         less_info_action = Action.NP_LESS if not show_cover else Action.NP_LESS_COVER
         keyboard = [
@@ -250,18 +374,25 @@ class ViewService:
                 ],
             )
         reply_markup = telegram.InlineKeyboardMarkup(keyboard)
-        last_played_track = recent_tracks[0].track
+        cover_url = await cover_task if cover_task else None
 
-        cover_url = None
-        if show_cover:
-            try:
-                last_played_track_album = last_played_track.get_album()
-                if last_played_track_album:
-                    cover_url = last_played_track_album.get_cover_image()
-            except Exception:
-                pass  # Track not found or no album info
+        return response, reply_markup, cover_url
 
-        return emojize(response), reply_markup, cover_url
+    @staticmethod
+    def _get_cover_url(played_track: pylast.PlayedTrack) -> str | None:
+        """Fetches the album cover of ``played_track``, if Last.fm has one."""
+        track = played_track.track
+        try:
+            if played_track.album:
+                # getRecentTracks already named the album, so skip track.getInfo
+                album = pylast.Album(track.artist, played_track.album, track.network)
+            else:
+                album = track.get_album()
+            if album:
+                return album.get_cover_image()
+        except Exception:
+            pass  # Track not found or no album info
+        return None
 
     async def build_tops_response(
         self,
@@ -270,94 +401,42 @@ class ViewService:
         period: Optional[lastfm.Period] = None,
     ) -> tuple[str, telegram.InlineKeyboardMarkup | None]:
         if not entity_type:
-            keyboard = [
-                [
-                    InlineKeyboardButton(
-                        "👤 Artist",
-                        callback_data=Callback(
-                            Action.TOPS, telegram_user_id, entity=Entity.ARTIST
-                        ).encode(),
-                    ),
-                    InlineKeyboardButton(
-                        "💿 Album",
-                        callback_data=Callback(
-                            Action.TOPS, telegram_user_id, entity=Entity.ALBUM
-                        ).encode(),
-                    ),
-                    InlineKeyboardButton(
-                        "🎵 Track",
-                        callback_data=Callback(
-                            Action.TOPS, telegram_user_id, entity=Entity.TRACK
-                        ).encode(),
-                    ),
-                ]
-            ]
-            reply_markup = telegram.InlineKeyboardMarkup(keyboard)
-            return emojize(
-                responses.tops_choose_entity_type.substitute()
-            ), reply_markup
+            reply_markup = tops_entity_keyboard(telegram_user_id)
+            return responses.tops_choose_entity_type.substitute(), reply_markup
 
         if not period:
-            period_display = {
-                CallbackPeriod.WEEK: "1week",
-                CallbackPeriod.MONTH_1: "1month",
-                CallbackPeriod.MONTH_3: "3month",
-                CallbackPeriod.MONTH_6: "6month",
-                CallbackPeriod.YEAR: "1year",
-                CallbackPeriod.OVERALL: "alltime",
-            }
             cb_entity = entity_from_lastfm(entity_type)
 
-            keyboard = []
-            row = []
-            for cb_period, name in period_display.items():
-                row.append(
-                    InlineKeyboardButton(
-                        name,
-                        callback_data=Callback(
-                            Action.TOPS, telegram_user_id, entity=cb_entity, period=cb_period
-                        ).encode(),
-                    )
-                )
-                if len(row) == 3:
-                    keyboard.append(row)
-                    row = []
-            if row:
-                keyboard.append(row)
-
-            reply_markup = telegram.InlineKeyboardMarkup(keyboard)
-            return emojize(
-                responses.tops_choose_period.substitute(
-                    entity_type=entity_type
-                )
-            ), reply_markup
+            reply_markup = tops_period_keyboard(telegram_user_id, cb_entity)
+            return (
+                responses.tops_choose_period.substitute(entity_type=entity_type),
+                reply_markup,
+            )
 
-        tops = self.lastfm_service.get_tops(telegram_user_id, entity_type, period)
-        user = db.get_user(telegram_user_id)
+        tops, user = await asyncio.gather(
+            self.lastfm_service.get_tops(telegram_user_id, entity_type, period),
+            db.read(db.get_user, telegram_user_id),
+        )
         if not tops:
-            return emojize(
+            return (
                 responses.tops_no_available_response.substitute(
                     lastfm_username=user.lastfm_username
-                )
-            ), None
+                ),
+                None,
+            )
 
-        tops_list = ""
-        for i, top in enumerate(tops, 1):
-            if entity_type == EntityType.ARTIST:
-                tops_list += f"{i}. <a href='{top.item.get_url()}'>{top.item.name}</a> - {top.weight} plays\n"
-            else:
-                tops_list += f"{i}. <a href='{top.item.get_url()}'>{top.item.title} — {top.item.artist}</a> - {top.weight} plays\n"
-
-        # Map period back to user-friendly name for display
-        period_display_map = {
-            lastfm.Period.WEEK: "1week",
-            lastfm.Period.ONE_MONTH: "1month",
-            lastfm.Period.THREE_MONTHS: "3month",
-            lastfm.Period.SIX_MONTHS: "6month",
-            lastfm.Period.YEAR: "1year",
-            lastfm.Period.OVERALL: "alltime",
-        }
-        period_name = period_display_map.get(period, period.name)
+        if entity_type == EntityType.ARTIST:
+            tops_list = "".join(
+                f"{i}. <a href='{top.item.get_url()}'>{top.item.name}</a> - {top.weight} plays\n"
+                for i, top in enumerate(tops, 1)
+            )
+        else:
+            tops_list = "".join(
+                f"{i}. <a href='{top.item.get_url()}'>{top.item.title} — {top.item.artist}</a> - {top.weight} plays\n"
+                for i, top in enumerate(tops, 1)
+            )
+
+        period_name = PERIOD_DISPLAY_NAMES.get(period, period.name)
 
         response = responses.tops_list.substitute(
             entity_type=entity_type,
@@ -365,7 +444,7 @@ class ViewService:
             tops_list=tops_list,
             lastfm_username=user.lastfm_username,
         )
-        return emojize(response), None
+        return response, None
 
     @staticmethod
     async def build_privacy_response() -> str:
@@ -374,15 +453,8 @@ class ViewService:
 
     @staticmethod
     async def build_changelog_response() -> str:
-        """Builds the changelog response by reading CHANGELOG.md."""
-        try:
-            changelog_content = config.CHANGELOG_PATH.read_text(encoding="utf-8")
-            max_length = 4000
-            if len(changelog_content) > max_length:
-                changelog_content = changelog_content[:max_length] + "\n\n... (truncated)"
-            return f"<pre>{changelog_content}</pre>"
-        except FileNotFoundError:
-            return "Changelog not available."
+        """Builds the changelog response from the CHANGELOG.md read at startup."""
+        return CHANGELOG_RESPONSE
 
     async def build_preferences_response(
         self, telegram_user_id: int
@@ -397,60 +469,64 @@ class ViewService:
             ]
         ]
         reply_markup = telegram.InlineKeyboardMarkup(keyboard)
-        return emojize(responses.preferences.substitute()), reply_markup
+        return responses.preferences.substitute(), reply_markup
 
-    def build_preferences_unlink_account_response(self, telegram_user_id: int) -> str:
+    async def build_preferences_unlink_account_response(
+        self, telegram_user_id: int
+    ) -> str:
         """Builds the preferences unlink account response."""
-        self.lastfm_service.unlink_user(telegram_user_id)
-        return emojize(responses.preferences_unlink_account.substitute())
+        await self.lastfm_service.unlink_user(telegram_user_id)
+        return responses.preferences_unlink_account.substitute()
 
     async def build_compare_response(
         self, telegram_user_id: int, other_lastfm_username: str
     ) -> str:
         """Builds the compare response between two users."""
-        user = db.get_user(telegram_user_id)
+        user = await db.read(db.get_user, telegram_user_id)
         if not user:
-            return emojize(responses.compare_no_lastfm_set.substitute())
+            return responses.compare_no_lastfm_set.substitute()
 
-        my_stats = self.lastfm_service._lastfm_client.get_user_stats(user.lastfm_username)
-        other_stats = self.lastfm_service._lastfm_client.get_user_stats(other_lastfm_username)
+        lastfm_client = self.lastfm_service._lastfm_client
+        my_stats, other_stats = await asyncio.gather(
+            lastfm_client.get_user_stats(user.lastfm_username),
+            lastfm_client.get_user_stats(other_lastfm_username),
+        )
 
         if not my_stats:
-            return emojize(
-                responses.compare_user_not_found.substitute(username=user.lastfm_username)
+            return responses.compare_user_not_found.substitute(
+                username=user.lastfm_username
             )
         if not other_stats:
-            return emojize(
-                responses.compare_user_not_found.substitute(username=other_lastfm_username)
+            return responses.compare_user_not_found.substitute(
+                username=other_lastfm_username
             )
 
-        common_artists = self.lastfm_service._lastfm_client.get_common_artists(
-            user.lastfm_username, other_lastfm_username
+        common_artists = lastfm_client.get_common_artists(
+            my_stats["top_artists"], other_stats["top_artists"]
         )
-
         if common_artists:
             common_artists_text = "\n".join(
-                f"• {a['name']} ({a['plays1']:,} / {a['plays2']:,})"
+                f"• {a['name']} ({a['plays1_fmt']} / {a['plays2_fmt']})"
                 for a in common_artists
             )
         else:
             common_artists_text = "None found"
 
         top_artists1_text = ", ".join(
-            f"{a['name']} ({a['plays']:,})" for a in my_stats["top_artists"][:3]
+            f"{a['name']} ({a['plays_fmt']})" for a in my_stats["top_artists"][:3]
         )
         top_artists2_text = ", ".join(
-            f"{a['name']} ({a['plays']:,})" for a in other_stats["top_artists"][:3]
+            f"{a['name']} ({a['plays_fmt']})" for a in other_stats["top_artists"][:3]
         )
 
         response = responses.compare_stats.substitute(
             user1=my_stats["username"],
             user2=other_stats["username"],
-            playcount1=f"{my_stats['playcount']:,}",
-            playcount2=f"{other_stats['playcount']:,}",
+            playcount1=my_stats["playcount_fmt"],
+            playcount2=other_stats["playcount_fmt"],
             common_count=len(common_artists),
             common_artists=common_artists_text,
             top_artists1=top_artists1_text,
             top_artists2=top_artists2_text,
         )
-        return emojize(response)
+        return response
@@ -0,0 +1,207 @@
+import base64
+import importlib
+import itertools
+import tempfile
+import unittest
+from unittest import mock
+
+import httpx
+
+import config
+import lastfm
+from cache import TTLCache
+from callbacks import (
+    ENCODED_LENGTH,
+    PAYLOAD,
+    VERSION,
+    Action,
+    Callback,
+    Entity,
+    Period,
+    encode_payload,
+)
+
+USER_INFO = b'<lfm status="ok"><user><playcount>42</playcount></user></lfm>'
+
+
+class TTLCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("cache.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = TTLCache(maxsize=3, ttl=10)
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.set("a", 1)
+        self.now += 9.9
+        self.assertEqual(self.cache.get("a"), 1)
+        self.now += 0.1
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("a", "missing"), "missing")
+
+    def test_per_call_ttl(self):
+        self.cache.set("short", 1, ttl=1)
+        self.cache.set("long", 2, ttl=100)
+        self.now += 50
+        self.assertIsNone(self.cache.get("short"))
+        self.assertEqual(self.cache.get("long"), 2)
+
+    def test_cached_none_is_a_hit(self):
+        missing = object()
+        self.cache.set("a", None)
+        self.assertIsNone(self.cache.get("a", missing))
+
+    def test_oldest_entry_is_evicted_at_maxsize(self):
+        for key in "abc":
+            self.cache.set(key, key)
+        self.cache.set("a", "a")  # Setting again moves "a" to the back
+        self.cache.set("d", "d")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual([self.cache.get(key) for key in "acd"], ["a", "c", "d"])
+
+    def test_pop(self):
+        self.cache.set("a", 1)
+        self.cache.pop("a")
+        self.cache.pop("missing")
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_discard_where(self):
+        for key in [("x", 1), ("x", 2), ("y", 1)]:
+            self.cache.set(key, key)
+        self.cache.discard_where(lambda key: key[0] == "x")
+        self.assertIsNone(self.cache.get(("x", 1)))
+        self.assertIsNone(self.cache.get(("x", 2)))
+        self.assertEqual(self.cache.get(("y", 1)), ("y", 1))
+
+    def test_clear(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+
+
+class CallbackDecodeTests(unittest.TestCase):
+    def test_round_trip(self):
+        for action, entity, period, owner_id in itertools.product(
+            Action, (None, *Entity), (None, *Period), (1, 123456789, 2**40)
+        ):
+            cb = Callback(action, owner_id, entity, period)
+            data = cb.encode()
+            self.assertEqual(len(data), ENCODED_LENGTH)
+            self.assertEqual(Callback.decode(data), cb)
+
+    def test_documented_example(self):
+        cb = Callback(Action.TOPS, 123456789, Entity.ARTIST, Period.WEEK)
+        self.assertEqual(cb.encode(), "AgQVzVsHAAAAAAEB")
+        self.assertEqual(Callback.decode("AgQVzVsHAAAAAAEB"), cb)
+
+    def test_enum_positions_are_append_only(self):
+        # Buttons already sent store these positions; reordering breaks them
+        self.assertEqual(
+            [action.value for action in Action][:5], ["nl", "nc", "nm", "pu", "t"]
+        )
+        self.assertEqual([entity.value for entity in Entity][:3], ["a", "b", "t"])
+        self.assertEqual(
+            [period.value for period in Period][:6], ["w", "1", "3", "6", "y", "o"]
+        )
+
+    def test_other_version_is_not_ours(self):
+        packed = PAYLOAD.pack(VERSION + 1, 0, 123456789, 0, 0)
+        data = base64.urlsafe_b64encode(packed).decode("ascii")
+        self.assertIsNone(Callback.decode(data))
+
+    def test_out_of_range_ids_are_not_ours(self):
+        self.assertIsNone(Callback.decode(encode_payload(len(Action), 1, 0, 0)))
+        self.assertIsNone(Callback.decode(encode_payload(0, 1, len(Entity) + 1, 0)))
+        self.assertIsNone(Callback.decode(encode_payload(0, 1, 0, len(Period) + 1)))
+
+    def test_non_ascii_data_is_not_ours(self):
+        data = "é" * ENCODED_LENGTH
+        self.assertIsNone(Callback.decode(data))
+
+
+class UserCacheTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # db connects and migrates on import, so point it at a throwaway file
+        tmp_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp_dir.cleanup)
+        with mock.patch.object(config, "DB_SQLITE_NAME", f"{tmp_dir.name}/test.db"):
+            cls.db = importlib.import_module("db")
+        cls.addClassCleanup(cls.db.db.close)
+
+    def setUp(self):
+        self.db.User.delete().execute()
+        self.db._user_cache.clear()
+        self.db.create_or_update_user(1, "someone", "before")
+        self.db._user_cache.clear()
+
+    def read_racing(self, write):
+        """Runs ``get_user(1)`` with ``write`` committing after the row is read."""
+        real_select = self.db.User.select
+        raced = False
+
+        def select(*args):
+            nonlocal raced
+            if raced:
+                return real_select(*args)
+            raced = True
+            stale = real_select(*args).where(self.db.User.telegram_id == 1).first()
+            write()
+            query = mock.Mock()
+            query.where.return_value.first.return_value = stale
+            return query
+
+        with mock.patch.object(self.db.User, "select", side_effect=select):
+            return self.db.get_user(1)
+
+    def test_read_racing_an_update_does_not_cache_the_old_row(self):
+        user = self.read_racing(
+            lambda: self.db.create_or_update_user(1, "someone", "after")
+        )
+        self.assertEqual(user.lastfm_username, "before")
+        self.assertEqual(self.db._user_cache.get(1).lastfm_username, "after")
+
+    def test_read_racing_a_delete_does_not_cache_the_old_row(self):
+        user = self.read_racing(lambda: self.db.delete_user(1))
+        self.assertEqual(user.lastfm_username, "before")
+        self.assertIsNone(self.db._user_cache.get(1))
+        self.assertIsNone(self.db.get_user(1))
+
+    def test_delete_user_evicts_the_cached_user(self):
+        self.assertEqual(self.db.get_user(1).lastfm_username, "before")
+        self.assertIsNotNone(self.db._user_cache.get(1))
+        self.db.delete_user(1)
+        self.assertIsNone(self.db._user_cache.get(1))
+        self.assertIsNone(self.db.get_user(1))
+
+
+class PooledTransportTests(unittest.TestCase):
+    def test_requests_share_the_mounted_transport(self):
+        client = lastfm.LastfmClient()
+        self.addCleanup(client.close)
+
+        def respond(transport, request):
+            return httpx.Response(200, content=USER_INFO, request=request)
+
+        with (
+            mock.patch.object(
+                httpx.HTTPTransport, "handle_request", autospec=True, side_effect=respond
+            ) as handle_request,
+            mock.patch.object(httpx.HTTPTransport, "close", autospec=True) as close,
+        ):
+            user = client.get_user("someone")
+            self.assertEqual(user.get_playcount(), 42)
+            self.assertEqual(user.get_playcount(), 42)
+
+        transports = [call.args[0] for call in handle_request.call_args_list]
+        self.assertEqual(transports, [client._transport, client._transport])
+        # pylast closes its per-request clients, but never the shared pool
+        closed = [call.args[0] for call in close.call_args_list]
+        self.assertNotIn(client._transport, closed)
+
+
+if __name__ == "__main__":
+    unittest.main()